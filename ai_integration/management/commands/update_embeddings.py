@@ -0,0 +1,53 @@
+"""
+Management command to embed all pending family content in batches
+Usage: python manage.py update_embeddings
+"""
+from django.core.management.base import BaseCommand, CommandError
+from family.models import Story, Event, Heritage, Health
+
+
+class Command(BaseCommand):
+    help = 'Generate missing embeddings with batched OpenAI requests'
+
+    MODEL_CLASSES = {
+        'story': Story,
+        'event': Event,
+        'heritage': Heritage,
+        'health': Health,
+    }
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--model',
+            choices=list(self.MODEL_CLASSES),
+            action='append',
+            help='Only embed this content type (repeatable, default: all)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            help='Rows per embedding batch (default: service setting)',
+        )
+        parser.add_argument(
+            '--stale',
+            action='store_true',
+            help='Also re-embed rows whose text changed since their last embedding',
+        )
+
+    def handle(self, *args, **options):
+        from ai_integration.services.embedding_service import embedding_service
+
+        batch_size = options['batch_size']
+        if batch_size is not None and batch_size < 1:
+            raise CommandError('--batch-size must be at least 1')
+
+        model_types = options['model'] or list(self.MODEL_CLASSES)
+        for model_type in model_types:
+            model_class = self.MODEL_CLASSES[model_type]
+            stats = embedding_service.bulk_update_embeddings(
+                model_class, batch_size, stale=options['stale']
+            )
+            self.stdout.write(
+                f"{model_class.__name__}: {stats['updated']} updated, "
+                f"{stats['skipped']} skipped, {stats['failed']} failed"
+            )
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-16 16:40
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_integration', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='embeddingcache',
+            name='ai_integrat_content_b85308_idx',
+        ),
+    ]
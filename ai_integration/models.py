@@ -63,7 +63,6 @@ class EmbeddingCache(models.Model):
     class Meta:
         indexes = [
             models.Index(fields=['content_type', 'content_id']),
-            models.Index(fields=['content_hash']),
         ]
         verbose_name = '嵌入缓存'
         verbose_name_plural = '嵌入缓存'
@@ -2,13 +2,18 @@
 Embedding generation service for family content
 Uses OpenAI text-embedding-3-small (cheaper than Anthropic)
 """
+import asyncio
 import hashlib
 import logging
-from typing import List, Optional, Dict, Any
+import math
+import threading
+from collections import OrderedDict
+from itertools import islice
+from typing import List, Optional, Dict, Any, Tuple
 from django.utils import timezone
 from django.conf import settings
 from django.db import models
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI
 from ..models import EmbeddingCache
 
 logger = logging.getLogger(__name__)
@@ -17,9 +22,64 @@ logger = logging.getLogger(__name__)
 class EmbeddingService:
     """Service for generating and managing content embeddings"""
     
+    # Maximum number of inputs sent in a single embeddings API request
+    MAX_BATCH_SIZE = 96
+    # Maximum embeddings requests in flight at once for async batches
+    MAX_CONCURRENT_REQUESTS = 5
+    # SDK retries for rate limits (429) and server errors, with backoff that honours Retry-After
+    MAX_RETRIES = 5
+    # Search ranks by inner product, which equals cosine similarity only for
+    # unit-length vectors; the API returns those, so drift means a model or
+    # dimensions change that affects every vector, and one sample per
+    # response is enough to catch it
+    UNIT_NORM_TOLERANCE = 1e-3
+    
+    # Fields read by _extract_content_text for each embedded model
+    CONTENT_FIELDS = {
+        'story': ['title', 'content'],
+        'event': ['name', 'description'],
+        'heritage': ['title', 'description'],
+        'health': ['title', 'description'],
+    }
+    
+    # Recent embeddings kept in process memory, keyed by the hash of the
+    # stripped text (what the API is sent), so generate_embedding and
+    # get_or_create_embedding share entries. Each
+    # 1536-float list costs ~50KB of Python objects, so keep it small for
+    # Heroku's 512MB limit
+    MEMORY_CACHE_SIZE = 128
+    
     def __init__(self):
-        self.client = OpenAI(api_key=getattr(settings, 'OPENAI_API_KEY', ''))
+        self.client = OpenAI(api_key=getattr(settings, 'OPENAI_API_KEY', ''), max_retries=self.MAX_RETRIES)
         self.model = "text-embedding-3-small"  # 1536 dimensions, $0.02/1M tokens
+        self._memory_cache = OrderedDict()
+        self._memory_cache_lock = threading.Lock()
+        self._unit_norm_warned = False
+        
+    def clear_memory_cache(self) -> None:
+        """Forget every embedding held in process memory"""
+        with self._memory_cache_lock:
+            self._memory_cache.clear()
+    
+    def _memory_cache_key(self, text: str) -> str:
+        """Key of ``text`` in the in-process cache"""
+        return self.get_content_hash(text.strip())
+    
+    def _memory_cache_get(self, content_hash: str) -> Optional[List[float]]:
+        """Return a recently used embedding and mark it most recent"""
+        with self._memory_cache_lock:
+            embedding = self._memory_cache.get(content_hash)
+            if embedding is not None:
+                self._memory_cache.move_to_end(content_hash)
+            return embedding
+    
+    def _memory_cache_put(self, content_hash: str, embedding: List[float]) -> None:
+        """Remember an embedding, evicting the least recently used one when full"""
+        with self._memory_cache_lock:
+            self._memory_cache[content_hash] = embedding
+            self._memory_cache.move_to_end(content_hash)
+            if len(self._memory_cache) > self.MEMORY_CACHE_SIZE:
+                self._memory_cache.popitem(last=False)
         
     def generate_embedding(self, text: str) -> Optional[List[float]]:
         """
@@ -33,6 +93,12 @@ class EmbeddingService:
         """
         if not text or not text.strip():
             return None
+        
+        # Repeated texts (e.g. the same chat query) skip the API entirely
+        memory_key = self._memory_cache_key(text)
+        embedding = self._memory_cache_get(memory_key)
+        if embedding is not None:
+            return embedding
             
         try:
             response = self.client.embeddings.create(
@@ -41,18 +107,133 @@ class EmbeddingService:
             )
             
             embedding = response.data[0].embedding
+            self._check_unit_norm(response.data)
             logger.info(f"Generated embedding for text (length: {len(text)})")
+            self._memory_cache_put(memory_key, embedding)
             return embedding
             
         except Exception as e:
             logger.error(f"Failed to generate embedding: {e}")
             return None
     
+    def generate_embeddings_batch(self, texts: List[str]) -> List[Optional[List[float]]]:
+        """
+        Generate embeddings for many texts with one API request per chunk
+        
+        Args:
+            texts: Text contents to embed
+            
+        Returns:
+            List of embedding vectors aligned with ``texts``; entries are None
+            for empty texts or when the request for their chunk failed
+        """
+        embeddings: List[Optional[List[float]]] = [None] * len(texts)
+        
+        for chunk in self._chunk_distinct_texts(texts):
+            try:
+                response = self.client.embeddings.create(
+                    model=self.model,
+                    input=[text for text, _ in chunk]
+                )
+            except Exception as e:
+                logger.error(f"Failed to generate embeddings batch: {e}")
+                continue
+            
+            self._check_unit_norm(response.data)
+            for item in response.data:
+                for i in chunk[item.index][1]:
+                    embeddings[i] = item.embedding
+            logger.info(f"Generated {len(chunk)} embeddings in one batch")
+        
+        return embeddings
+    
+    async def agenerate_embeddings_batch(self, texts: List[str]) -> List[Optional[List[float]]]:
+        """
+        Async variant of generate_embeddings_batch that sends all chunks concurrently
+        
+        Args:
+            texts: Text contents to embed
+            
+        Returns:
+            List of embedding vectors aligned with ``texts``
+        """
+        embeddings: List[Optional[List[float]]] = [None] * len(texts)
+        
+        chunks = self._chunk_distinct_texts(texts)
+        if not chunks:
+            return embeddings
+        
+        semaphore = asyncio.Semaphore(self.MAX_CONCURRENT_REQUESTS)
+        
+        async def embed_chunk(client, chunk):
+            async with semaphore:
+                return await client.embeddings.create(
+                    model=self.model,
+                    input=[text for text, _ in chunk]
+                )
+        
+        # A client per call: its connection pool is bound to the event loop,
+        # and asyncio.run closes that loop after every batch. Settings are
+        # copied from the sync client so both paths talk to the same endpoint
+        async with AsyncOpenAI(
+            api_key=self.client.api_key,
+            base_url=self.client.base_url,
+            max_retries=self.client.max_retries
+        ) as client:
+            responses = await asyncio.gather(
+                *[embed_chunk(client, chunk) for chunk in chunks],
+                return_exceptions=True
+            )
+        
+        for chunk, response in zip(chunks, responses):
+            if isinstance(response, Exception):
+                logger.error(f"Failed to generate embeddings batch: {response}")
+                continue
+            self._check_unit_norm(response.data)
+            for item in response.data:
+                for i in chunk[item.index][1]:
+                    embeddings[i] = item.embedding
+        
+        distinct_count = sum(len(chunk) for chunk in chunks)
+        logger.info(f"Generated embeddings for {distinct_count} texts in {len(chunks)} concurrent batches")
+        return embeddings
+    
+    def _check_unit_norm(self, data) -> None:
+        """Warn once per process when an API response holds non-unit embeddings"""
+        if self._unit_norm_warned or not data:
+            return
+        norm = math.hypot(*data[0].embedding)
+        if abs(norm * norm - 1) > self.UNIT_NORM_TOLERANCE:
+            self._unit_norm_warned = True
+            logger.warning(
+                f"Embedding from {self.model} has squared norm {norm * norm:.4f}, not 1; "
+                f"inner-product search scores will not match cosine similarity"
+            )
+    
+    def _chunk_distinct_texts(self, texts: List[str]) -> List[List[Tuple[str, List[int]]]]:
+        """
+        Split the distinct non-empty texts into API-sized chunks
+        
+        Each entry pairs a stripped text with every position it occupies in
+        ``texts``, so repeated texts are sent to the API only once.
+        """
+        positions: Dict[str, List[int]] = {}
+        for i, text in enumerate(texts):
+            if text and text.strip():
+                positions.setdefault(text.strip(), []).append(i)
+        
+        pending = list(positions.items())
+        return [
+            pending[start:start + self.MAX_BATCH_SIZE]
+            for start in range(0, len(pending), self.MAX_BATCH_SIZE)
+        ]
+    
     def get_content_hash(self, text: str) -> str:
         """Generate SHA256 hash of content for caching"""
         return hashlib.sha256(text.encode('utf-8')).hexdigest()
     
-    def get_or_create_embedding(self, text: str, content_type: str, content_id: int) -> Optional[List[float]]:
+    def get_or_create_embedding(self, text: str, content_type: str, content_id: int,
+                                content_hash: Optional[str] = None) -> Optional[List[float]]:
         """
         Get embedding from cache or generate new one
         
@@ -60,6 +241,7 @@ class EmbeddingService:
             text: Text content to embed
             content_type: Type of content (story, event, heritage, health)
             content_id: ID of the content object
+            content_hash: Precomputed hash of ``text``, if the caller already has it
             
         Returns:
             List of embedding vectors or None if failed
@@ -67,12 +249,19 @@ class EmbeddingService:
         if not text or not text.strip():
             return None
             
-        content_hash = self.get_content_hash(text)
+        if content_hash is None:
+            content_hash = self.get_content_hash(text)
+        
+        # Process memory first, then the database cache
+        memory_key = self._memory_cache_key(text)
+        embedding = self._memory_cache_get(memory_key)
+        if embedding is not None:
+            return embedding
         
-        # Try to get from cache first
         try:
             cached = EmbeddingCache.objects.get(content_hash=content_hash)
             logger.info(f"Using cached embedding for {content_type}:{content_id}")
+            self._memory_cache_put(memory_key, cached.embedding)
             return cached.embedding
         except EmbeddingCache.DoesNotExist:
             pass
@@ -80,15 +269,16 @@ class EmbeddingService:
         # Generate new embedding
         embedding = self.generate_embedding(text)
         if embedding:
-            # Cache the embedding
-            EmbeddingCache.objects.update_or_create(
-                content_hash=content_hash,
-                defaults={
-                    'content_type': content_type,
-                    'content_id': content_id,
-                    'embedding': embedding,
-                }
-            )
+            # Cache the embedding with a single INSERT; a row for the same hash
+            # written concurrently holds the same embedding, so conflicts are skipped
+            EmbeddingCache.objects.bulk_create([
+                EmbeddingCache(
+                    content_hash=content_hash,
+                    content_type=content_type,
+                    content_id=content_id,
+                    embedding=embedding,
+                )
+            ], ignore_conflicts=True)
             logger.info(f"Cached new embedding for {content_type}:{content_id}")
         
         return embedding
@@ -114,25 +304,24 @@ class EmbeddingService:
             logger.warning(f"No content text found for {type(instance).__name__}:{instance.id}")
             return False
         
-        # Check if update needed
-        if not force_update and instance.content_embedding and instance.embedding_updated:
-            content_hash = self.get_content_hash(content_text)
-            try:
-                cached = EmbeddingCache.objects.get(content_hash=content_hash)
-                if cached.embedding == instance.content_embedding:
-                    logger.info(f"Embedding up to date for {type(instance).__name__}:{instance.id}")
-                    return False
-            except EmbeddingCache.DoesNotExist:
-                pass
+        # Hash once; reused for the freshness check and the cache lookup
+        content_hash = self.get_content_hash(content_text)
+        
+        # Up to date when the stored embedding was generated from the same text
+        if (not force_update and instance.content_embedding is not None
+                and getattr(instance, 'content_hash', None) == content_hash):
+            logger.info(f"Embedding up to date for {type(instance).__name__}:{instance.id}")
+            return False
         
         # Generate/get embedding
         content_type = type(instance).__name__.lower()
-        embedding = self.get_or_create_embedding(content_text, content_type, instance.id)
+        embedding = self.get_or_create_embedding(content_text, content_type, instance.id, content_hash)
         
         if embedding:
             instance.content_embedding = embedding
             instance.embedding_updated = timezone.now()
-            instance.save(update_fields=['content_embedding', 'embedding_updated'])
+            instance.content_hash = content_hash
+            instance.save(update_fields=['content_embedding', 'embedding_updated', 'content_hash'])
             logger.info(f"Updated embedding for {content_type}:{instance.id}")
             return True
         
@@ -162,43 +351,148 @@ class EmbeddingService:
         
         return ""
     
-    def bulk_update_embeddings(self, model_class, batch_size: int = 10) -> Dict[str, int]:
+    def bulk_update_embeddings(self, model_class, batch_size: Optional[int] = None,
+                               stale: bool = False) -> Dict[str, int]:
         """
         Bulk update embeddings for all instances of a model
         
         Args:
             model_class: Django model class
-            batch_size: Number of instances to process at once
+            batch_size: Number of instances to process at once; defaults to
+                enough rows to keep every concurrent API request full
+            stale: Also re-check every embedded row against its content hash,
+                catching rows edited after their last successful embedding
             
         Returns:
             Dict with statistics: {'updated': int, 'skipped': int, 'failed': int}
         """
         stats = {'updated': 0, 'skipped': 0, 'failed': 0}
+        if batch_size is None:
+            batch_size = self.MAX_BATCH_SIZE * self.MAX_CONCURRENT_REQUESTS
         
-        # Get instances that need embedding updates
-        instances = model_class.objects.filter(
-            models.Q(content_embedding__isnull=True) | 
-            models.Q(embedding_updated__isnull=True)
-        )
+        # Get instances that need embedding updates; rows embedded before
+        # content hashes were recorded have an empty hash
+        if stale:
+            instances = model_class.objects.all()
+        else:
+            instances = model_class.objects.filter(
+                models.Q(content_embedding__isnull=True) | 
+                models.Q(embedding_updated__isnull=True) |
+                models.Q(content_hash='')
+            )
+        
+        # Only load the columns the content text is built from
+        content_fields = self.CONTENT_FIELDS.get(model_class.__name__.lower())
+        if content_fields:
+            instances = instances.only('id', 'embedding_updated', 'content_hash', *content_fields)
         
-        total = instances.count()
-        logger.info(f"Bulk updating embeddings for {total} {model_class.__name__} instances")
+        logger.info(f"Bulk updating embeddings for {model_class.__name__} instances")
         
-        for i in range(0, total, batch_size):
-            batch = instances[i:i + batch_size]
+        # Stream rows with a single query; slicing would re-run it with a
+        # growing OFFSET, and rows updated by earlier batches drop out of the
+        # filter so later offsets would skip pending rows
+        rows = instances.iterator(chunk_size=batch_size)
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                break
+            
+            try:
+                batch_stats = self._update_embeddings_batch(model_class, batch, stale)
+            except Exception as e:
+                batch_stats = {'updated': 0, 'skipped': 0, 'failed': len(batch)}
+                logger.error(f"Failed to update embeddings for {model_class.__name__} batch: {e}")
             
-            for instance in batch:
-                try:
-                    if self.update_model_embedding(instance):
-                        stats['updated'] += 1
-                    else:
-                        stats['skipped'] += 1
-                except Exception as e:
-                    stats['failed'] += 1
-                    logger.error(f"Failed to update embedding for {model_class.__name__}:{instance.id}: {e}")
+            for key, count in batch_stats.items():
+                stats[key] += count
         
         logger.info(f"Bulk update complete: {stats}")
         return stats
+    
+    def _update_embeddings_batch(self, model_class, batch, stale: bool = False) -> Dict[str, int]:
+        """
+        Update embeddings for one batch of instances
+        
+        Uses a single cache query, concurrent embeddings API requests for the
+        cache misses and one bulk write each for the model and the cache.
+        With stale, rows whose stored hash still matches their text are skipped.
+        """
+        stats = {'updated': 0, 'skipped': 0, 'failed': 0}
+        content_type = model_class.__name__.lower()
+        
+        pending = []
+        for instance in batch:
+            content_text = self._extract_content_text(instance)
+            if not content_text or not content_text.strip():
+                stats['skipped'] += 1
+                continue
+            content_hash = self.get_content_hash(content_text)
+            # The embedding, its timestamp and its hash are always written
+            # together, so a timestamp plus a matching hash means up to date
+            if (stale and instance.embedding_updated is not None
+                    and instance.content_hash == content_hash):
+                stats['skipped'] += 1
+                continue
+            pending.append((instance, content_text, content_hash))
+        
+        if not pending:
+            return stats
+        
+        embeddings = dict(
+            EmbeddingCache.objects.filter(
+                content_hash__in={content_hash for _, _, content_hash in pending}
+            ).values_list('content_hash', 'embedding')
+        )
+        
+        # Embed each distinct uncached text once
+        missing = {}
+        for instance, content_text, content_hash in pending:
+            if content_hash not in embeddings and content_hash not in missing:
+                missing[content_hash] = (instance, content_text)
+        
+        cache_entries = []
+        if missing:
+            texts = [text for _, text in missing.values()]
+            try:
+                asyncio.get_running_loop()
+            except RuntimeError:
+                generated = asyncio.run(self.agenerate_embeddings_batch(texts))
+            else:
+                # asyncio.run cannot start inside a running loop (e.g. when
+                # called from async code), so send the chunks sequentially
+                generated = self.generate_embeddings_batch(texts)
+            for (content_hash, (instance, _)), embedding in zip(missing.items(), generated):
+                if embedding is None:
+                    continue
+                embeddings[content_hash] = embedding
+                cache_entries.append(EmbeddingCache(
+                    content_hash=content_hash,
+                    content_type=content_type,
+                    content_id=instance.id,
+                    embedding=embedding,
+                ))
+        
+        now = timezone.now()
+        updated = []
+        for instance, _, content_hash in pending:
+            if content_hash not in embeddings:
+                stats['failed'] += 1
+                logger.error(f"No embedding generated for {content_type}:{instance.id}")
+                continue
+            instance.content_embedding = embeddings[content_hash]
+            instance.embedding_updated = now
+            instance.content_hash = content_hash
+            updated.append(instance)
+        
+        if updated:
+            model_class.objects.bulk_update(
+                updated, ['content_embedding', 'embedding_updated', 'content_hash']
+            )
+            stats['updated'] = len(updated)
+        if cache_entries:
+            EmbeddingCache.objects.bulk_create(cache_entries, ignore_conflicts=True)
+        
+        return stats
 
 
 # Global service instance
@@ -3,6 +3,7 @@ RAG (Retrieval-Augmented Generation) service
 Combines semantic search with AI response generation
 """
 import logging
+import re
 import time
 from typing import List, Dict, Any, Optional
 from django.conf import settings
@@ -12,6 +13,18 @@ from .embedding_service import embedding_service
 
 logger = logging.getLogger(__name__)
 
+# CJK Unified Ideographs, counted by _detect_language
+_CJK_RE = re.compile('[\u4e00-\u9fff]')
+
+# Keywords used by _classify_query, in priority order
+QUERY_TYPE_KEYWORDS = [
+    ('health_pattern', ['health', 'medical', 'illness', 'disease', 'hereditary', 'genetic', '健康', '疾病', '遗传']),
+    ('event_planning', ['celebration', 'party', 'reunion', 'birthday', 'wedding', '庆祝', '聚会', '生日']),
+    ('cultural_heritage', ['tradition', 'heritage', 'recipe', 'values', 'wisdom', '传统', '文化', '智慧']),
+    ('relationship_discovery', ['family', 'relative', 'relationship', 'cousin', '亲戚', '家人', '关系']),
+    ('memory_discovery', ['story', 'memory', 'remember', 'childhood', 'past', '故事', '回忆', '童年']),
+]
+
 
 class RAGService:
     """Service for RAG-based family knowledge queries"""
@@ -43,8 +56,9 @@ class RAGService:
         start_time = time.time()
         
         try:
-            # Step 1: Determine query type
+            # Step 1: Determine query type and language
             query_type = self._classify_query(query)
+            language = self._detect_language(query)
             
             # Step 2: Semantic search for relevant content
             search_results = self.search_service.semantic_search(
@@ -60,7 +74,7 @@ class RAGService:
             if context:
                 response_text = self._generate_ai_response(query, context, query_type)
             else:
-                response_text = self._generate_fallback_response(query, query_type)
+                response_text = self._generate_fallback_response(query, query_type, language)
             
             # Step 5: Format response
             processing_time = time.time() - start_time
@@ -74,7 +88,7 @@ class RAGService:
                     'confidence': self._calculate_confidence(search_results),
                     'processing_time': round(processing_time, 2),
                     'sources_count': len(search_results),
-                    'language': self._detect_language(query)
+                    'language': language
                 }
             }
             
@@ -86,30 +100,10 @@ class RAGService:
         """Classify query type based on content"""
         query_lower = query.lower()
         
-        # Health-related keywords
-        health_keywords = ['health', 'medical', 'illness', 'disease', 'hereditary', 'genetic', '健康', '疾病', '遗传']
-        if any(keyword in query_lower for keyword in health_keywords):
-            return 'health_pattern'
-        
-        # Event planning keywords
-        event_keywords = ['celebration', 'party', 'reunion', 'birthday', 'wedding', '庆祝', '聚会', '生日']
-        if any(keyword in query_lower for keyword in event_keywords):
-            return 'event_planning'
-        
-        # Heritage/tradition keywords
-        heritage_keywords = ['tradition', 'heritage', 'recipe', 'values', 'wisdom', '传统', '文化', '智慧']
-        if any(keyword in query_lower for keyword in heritage_keywords):
-            return 'cultural_heritage'
-        
-        # Relationship keywords
-        relationship_keywords = ['family', 'relative', 'relationship', 'cousin', '亲戚', '家人', '关系']
-        if any(keyword in query_lower for keyword in relationship_keywords):
-            return 'relationship_discovery'
-        
-        # Memory/story keywords
-        memory_keywords = ['story', 'memory', 'remember', 'childhood', 'past', '故事', '回忆', '童年']
-        if any(keyword in query_lower for keyword in memory_keywords):
-            return 'memory_discovery'
+        # A query can match several types; the earliest one in QUERY_TYPE_KEYWORDS wins
+        for query_type, keywords in QUERY_TYPE_KEYWORDS:
+            if any(keyword in query_lower for keyword in keywords):
+                return query_type
         
         return 'general'
     
@@ -228,9 +222,10 @@ elders, and deep appreciation for family bonds."""
         
         return base_prompt + type_specific.get(query_type, type_specific['general'])
     
-    def _generate_fallback_response(self, query: str, query_type: str) -> str:
+    def _generate_fallback_response(self, query: str, query_type: str, language: Optional[str] = None) -> str:
         """Generate fallback response when no relevant content is found"""
-        language = self._detect_language(query)
+        if language is None:
+            language = self._detect_language(query)
         
         if language == 'zh-CN':
             fallback_responses = {
@@ -256,7 +251,7 @@ elders, and deep appreciation for family bonds."""
     def _detect_language(self, query: str) -> str:
         """Simple language detection"""
         # Check for Chinese characters
-        chinese_chars = sum(1 for char in query if '\u4e00' <= char <= '\u9fff')
+        chinese_chars = len(_CJK_RE.findall(query))
         if chinese_chars > len(query) * 0.3:  # More than 30% Chinese characters
             return 'zh-CN'
         return 'en-US'
@@ -3,10 +3,11 @@ Semantic search service using pgvector
 Searches across family content using vector similarity
 """
 import logging
+from contextlib import contextmanager, nullcontext
 from typing import List, Dict, Any, Union, Optional
-from django.db import models
-from django.db.models import Q, F
-from pgvector.django import CosineDistance, L2Distance
+from django.db import connection, models, transaction
+from django.db.models import Q, F, Prefetch
+from pgvector.django import L2Distance, MaxInnerProduct
 from family.models import Story, Event, Heritage, Health, Person
 from .embedding_service import embedding_service
 
@@ -24,9 +25,77 @@ class SearchService:
         'health': Health,
     }
     
+    # Category names accepted by search_by_category, mapped to model types
+    CATEGORY_MAPPING = {
+        'stories': 'story',
+        'events': 'event',
+        'heritage': 'heritage',
+        'health': 'health',
+        'memories': 'story',  # Alias
+        'traditions': 'heritage',  # Alias
+    }
+    
+    # Relations read by _format_search_result, loaded up front to avoid N+1 queries.
+    # Only names are shown for people, so skip loading bios and photos.
+    RELATED_FIELDS = {
+        Story: {'select': [], 'prefetch': [Prefetch('people', queryset=Person.objects.only('id', 'name'))]},
+        Event: {'select': ['location'], 'prefetch': [Prefetch('participants', queryset=Person.objects.only('id', 'name'))]},
+        Heritage: {'select': ['origin_person'], 'prefetch': []},
+        Health: {'select': ['person'], 'prefetch': []},
+    }
+    
+    # pgvector's default hnsw.ef_search; an HNSW scan returns at most this many rows
+    HNSW_EF_SEARCH = 40
+    HNSW_EF_SEARCH_MAX = 1000
+    
     def __init__(self):
         self.embedding_service = embedding_service
     
+    @contextmanager
+    def _hnsw_ef_search(self, limit: int):
+        """
+        Widen the HNSW candidate list for large limits
+        
+        ef_search is set to 4x the limit (capped at HNSW_EF_SEARCH_MAX) so the
+        threshold filter still leaves enough rows. SET LOCAL only lasts until
+        the end of the transaction, so every query of the search must run
+        inside this block, which yields True when it opened that transaction.
+        Inside a caller's transaction atomic() only opens a savepoint, and
+        releasing it keeps SET LOCAL in effect, so the previous value is put
+        back on the way out.
+        """
+        ef_search = min(limit * 4, self.HNSW_EF_SEARCH_MAX)
+        if connection.vendor != 'postgresql' or ef_search <= self.HNSW_EF_SEARCH:
+            yield False
+            return
+        nested = connection.in_atomic_block
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                if nested:
+                    # NULL until the vector library is loaded in this session
+                    cursor.execute("SELECT current_setting('hnsw.ef_search', true)")
+                    previous = cursor.fetchone()[0]
+                cursor.execute('SET LOCAL hnsw.ef_search = %s', [ef_search])
+            yield True
+            if nested:
+                with connection.cursor() as cursor:
+                    if previous is None:
+                        cursor.execute('SET LOCAL hnsw.ef_search TO DEFAULT')
+                    else:
+                        cursor.execute('SET LOCAL hnsw.ef_search = %s', [previous])
+    
+    def _with_related(self, queryset, model_class):
+        """Load what _format_search_result reads: related rows, but not the embedding vector"""
+        related = self.RELATED_FIELDS.get(model_class)
+        if not related:
+            return queryset
+        queryset = queryset.defer('content_embedding')
+        if related['select']:
+            queryset = queryset.select_related(*related['select'])
+        if related['prefetch']:
+            queryset = queryset.prefetch_related(*related['prefetch'])
+        return queryset
+    
     def semantic_search(
         self, 
         query: str, 
@@ -55,6 +124,51 @@ class SearchService:
             logger.error("Failed to generate query embedding")
             return []
         
+        return self._search_with_embedding(query_embedding, model_types, limit, similarity_threshold)
+    
+    def semantic_search_multi(
+        self, 
+        queries: List[str], 
+        model_types: Optional[List[str]] = None,
+        limit: int = 10,
+        similarity_threshold: float = 0.7
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Run several semantic searches, embedding all queries in one API request
+        
+        Args:
+            queries: Search query texts
+            model_types: List of model types to search ('story', 'event', etc.)
+            limit: Maximum number of results per query
+            similarity_threshold: Minimum similarity score (0-1)
+            
+        Returns:
+            List of result lists aligned with ``queries``; empty for blank
+            queries or when the query embedding failed
+        """
+        query_embeddings = self.embedding_service.generate_embeddings_batch(queries)
+        
+        all_results = []
+        for query, query_embedding in zip(queries, query_embeddings):
+            if not query_embedding:
+                if query and query.strip():
+                    logger.error(f"Failed to generate query embedding for: {query[:50]}")
+                all_results.append([])
+                continue
+            all_results.append(
+                self._search_with_embedding(query_embedding, model_types, limit, similarity_threshold)
+            )
+        
+        return all_results
+    
+    def _search_with_embedding(
+        self, 
+        query_embedding: List[float],
+        model_types: Optional[List[str]],
+        limit: int,
+        similarity_threshold: float
+    ) -> List[Dict[str, Any]]:
+        """Search the given model types with an already generated query embedding"""
         # Default to all searchable models
         if not model_types:
             model_types = list(self.SEARCHABLE_MODELS.keys())
@@ -62,24 +176,26 @@ class SearchService:
         all_results = []
         
         # Search each model type
-        for model_type in model_types:
-            if model_type not in self.SEARCHABLE_MODELS:
-                logger.warning(f"Unknown model type: {model_type}")
-                continue
+        with self._hnsw_ef_search(limit) as in_transaction:
+            for model_type in model_types:
+                if model_type not in self.SEARCHABLE_MODELS:
+                    logger.warning(f"Unknown model type: {model_type}")
+                    continue
+                    
+                model_class = self.SEARCHABLE_MODELS[model_type]
+                results = self._search_model(
+                    model_class, 
+                    query_embedding, 
+                    limit, 
+                    similarity_threshold,
+                    savepoint=in_transaction
+                )
                 
-            model_class = self.SEARCHABLE_MODELS[model_type]
-            results = self._search_model(
-                model_class, 
-                query_embedding, 
-                limit, 
-                similarity_threshold
-            )
-            
-            # Add model type to results
-            for result in results:
-                result['content_type'] = model_type
-                
-            all_results.extend(results)
+                # Add model type to results
+                for result in results:
+                    result['content_type'] = model_type
+                    
+                all_results.extend(results)
         
         # Sort by similarity score and limit
         all_results.sort(key=lambda x: x['similarity'], reverse=True)
@@ -90,25 +206,36 @@ class SearchService:
         model_class: models.Model, 
         query_embedding: List[float],
         limit: int,
-        similarity_threshold: float
+        similarity_threshold: float,
+        savepoint: bool = False
     ) -> List[Dict[str, Any]]:
-        """Search a specific model class using vector similarity"""
+        """
+        Search a specific model class using vector similarity
+        
+        With savepoint=True the query runs in its own savepoint, so a failure
+        here does not abort the transaction the other models are searched in.
+        """
         try:
-            # Use cosine distance for similarity search
-            results = model_class.objects.filter(
-                content_embedding__isnull=False
-            ).annotate(
-                distance=CosineDistance('content_embedding', query_embedding)
-            ).annotate(
-                similarity=1 - F('distance')  # Convert distance to similarity
+            # OpenAI embeddings are unit length, so the inner product is the
+            # cosine similarity without the per-row normalization; ordering by
+            # the distance itself lets Postgres walk the HNSW index
+            queryset = self._with_related(
+                model_class.objects.filter(content_embedding__isnull=False),
+                model_class
+            )
+            results = queryset.annotate(
+                distance=MaxInnerProduct('content_embedding', query_embedding)
             ).filter(
-                similarity__gte=similarity_threshold
-            ).order_by('-similarity')[:limit]
+                distance__lte=-similarity_threshold  # Compare on the ordered expression itself
+            ).annotate(
+                similarity=-F('distance')  # pgvector returns the negative inner product
+            ).order_by('distance')[:limit]
             
             search_results = []
-            for obj in results:
-                result = self._format_search_result(obj)
-                search_results.append(result)
+            with transaction.atomic() if savepoint else nullcontext():
+                for obj in results:
+                    result = self._format_search_result(obj)
+                    search_results.append(result)
             
             logger.info(f"Found {len(search_results)} results in {model_class.__name__}")
             return search_results
@@ -192,17 +319,7 @@ class SearchService:
             category: Category to search ('stories', 'events', 'heritage', 'health')
             limit: Maximum results
         """
-        # Map category names to model types
-        category_mapping = {
-            'stories': 'story',
-            'events': 'event',
-            'heritage': 'heritage',
-            'health': 'health',
-            'memories': 'story',  # Alias
-            'traditions': 'heritage',  # Alias
-        }
-        
-        model_type = category_mapping.get(category.lower())
+        model_type = self.CATEGORY_MAPPING.get(category.lower())
         if not model_type:
             logger.warning(f"Unknown category: {category}")
             return []
@@ -237,21 +354,24 @@ class SearchService:
             
             # Search for similar content (excluding the reference object)
             all_results = []
-            for model_type, search_model in self.SEARCHABLE_MODELS.items():
-                results = search_model.objects.filter(
-                    content_embedding__isnull=False
-                ).exclude(
-                    id=content_id if model_type == content_type else None
-                ).annotate(
-                    distance=CosineDistance('content_embedding', ref_obj.content_embedding)
-                ).annotate(
-                    similarity=1 - F('distance')
-                ).order_by('-similarity')[:limit]
-                
-                for obj in results:
-                    result = self._format_search_result(obj)
-                    result['content_type'] = model_type
-                    all_results.append(result)
+            with self._hnsw_ef_search(limit):
+                for model_type, search_model in self.SEARCHABLE_MODELS.items():
+                    queryset = self._with_related(
+                        search_model.objects.filter(content_embedding__isnull=False),
+                        search_model
+                    )
+                    results = queryset.exclude(
+                        id=content_id if model_type == content_type else None
+                    ).annotate(
+                        distance=MaxInnerProduct('content_embedding', ref_obj.content_embedding)
+                    ).annotate(
+                        similarity=-F('distance')
+                    ).order_by('distance')[:limit]
+                    
+                    for obj in results:
+                        result = self._format_search_result(obj)
+                        result['content_type'] = model_type
+                        all_results.append(result)
             
             # Sort and limit
             all_results.sort(key=lambda x: x['similarity'], reverse=True)
@@ -293,7 +413,7 @@ class SearchService:
             elif model_type == 'health':
                 search_q = Q(title__icontains=query) | Q(description__icontains=query)
             
-            results = model_class.objects.filter(search_q)[:limit]
+            results = self._with_related(model_class.objects.filter(search_q), model_class)[:limit]
             
             for obj in results:
                 result = self._format_search_result(obj)
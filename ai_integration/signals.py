@@ -2,49 +2,46 @@
 Django signals for automatic embedding updates
 """
 import logging
+from django.db import transaction
 from django.db.models.signals import post_save
-from django.dispatch import receiver
+from django.utils.functional import SimpleLazyObject
 from family.models import Story, Event, Heritage, Health
-from .services.embedding_service import embedding_service
 
 logger = logging.getLogger(__name__)
 
 
-@receiver(post_save, sender=Story)
-def update_story_embedding(sender, instance, created, **kwargs):
-    """Update embedding when Story is saved"""
-    try:
-        embedding_service.update_model_embedding(instance, force_update=created)
-        logger.info(f"Updated embedding for Story:{instance.id}")
-    except Exception as e:
-        logger.error(f"Failed to update Story embedding: {e}")
+def _get_embedding_service():
+    from .services.embedding_service import embedding_service
+    return embedding_service
 
 
-@receiver(post_save, sender=Event)
-def update_event_embedding(sender, instance, created, **kwargs):
-    """Update embedding when Event is saved"""
-    try:
-        embedding_service.update_model_embedding(instance, force_update=created)
-        logger.info(f"Updated embedding for Event:{instance.id}")
-    except Exception as e:
-        logger.error(f"Failed to update Event embedding: {e}")
+# Resolved on first save so app loading (migrate, collectstatic, other
+# management commands) does not import the OpenAI SDK
+embedding_service = SimpleLazyObject(_get_embedding_service)
 
 
-@receiver(post_save, sender=Heritage)
-def update_heritage_embedding(sender, instance, created, **kwargs):
-    """Update embedding when Heritage is saved"""
-    try:
-        embedding_service.update_model_embedding(instance, force_update=created)
-        logger.info(f"Updated embedding for Heritage:{instance.id}")
-    except Exception as e:
-        logger.error(f"Failed to update Heritage embedding: {e}")
+# Models whose text is embedded for semantic search
+EMBEDDED_MODELS = (Story, Event, Heritage, Health)
+
 
+def update_content_embedding(sender, instance, created, **kwargs):
+    """Update embedding when a searchable model is saved"""
+    # Call OpenAI after the save commits, so the row is not held locked
+    # during the request and a rolled-back save costs no API call
+    transaction.on_commit(lambda: _update_embedding(sender, instance, created))
 
-@receiver(post_save, sender=Health)
-def update_health_embedding(sender, instance, created, **kwargs):
-    """Update embedding when Health record is saved"""
+
+def _update_embedding(sender, instance, created):
     try:
         embedding_service.update_model_embedding(instance, force_update=created)
-        logger.info(f"Updated embedding for Health:{instance.id}")
+        logger.info(f"Updated embedding for {sender.__name__}:{instance.id}")
     except Exception as e:
-        logger.error(f"Failed to update Health embedding: {e}")
\ No newline at end of file
+        logger.error(f"Failed to update {sender.__name__} embedding: {e}")
+
+
+for model_class in EMBEDDED_MODELS:
+    post_save.connect(
+        update_content_embedding,
+        sender=model_class,
+        dispatch_uid=f'update_{model_class.__name__.lower()}_embedding'
+    )
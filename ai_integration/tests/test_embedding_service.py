@@ -131,21 +131,24 @@ class TestEmbeddingService(TestCase):
         content_text = embedding_service._extract_content_text(person_no_bio)
         self.assertEqual(content_text, person_no_bio.name)
     
-    @patch('ai_integration.services.embedding_service.OpenAI')
-    def test_update_model_embedding(self, mock_openai):
+    @patch.object(embedding_service, 'client')
+    def test_update_model_embedding(self, mock_client):
         """Test updating model instance embedding"""
         # Mock OpenAI response
         test_embedding = [0.1, 0.2, 0.3] * 512
         mock_response = Mock()
         mock_response.data = [Mock(embedding=test_embedding)]
-        mock_openai.return_value.embeddings.create.return_value = mock_response
+        mock_client.embeddings.create.return_value = mock_response
         
         # Test embedding update
         result = embedding_service.update_model_embedding(self.story)
         
         self.assertTrue(result)
         self.story.refresh_from_db()
-        self.assertEqual(self.story.content_embedding, test_embedding)
+        # halfvec stores fp16, so values come back rounded
+        self.assertEqual(len(self.story.content_embedding), len(test_embedding))
+        for stored, expected in zip(self.story.content_embedding, test_embedding):
+            self.assertAlmostEqual(stored, expected, delta=1e-3)
         self.assertIsNotNone(self.story.embedding_updated)
     
     def test_update_model_embedding_no_content(self):
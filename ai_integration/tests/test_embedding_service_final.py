@@ -32,22 +32,41 @@ if not settings.configured:
     )
     django.setup()
 
+import asyncio
+import json
+import threading
 import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from unittest.mock import Mock, patch, MagicMock, call
 from datetime import datetime
-import hashlib
+from types import SimpleNamespace
 import logging
 
+from openai import OpenAI
 from ai_integration.services.embedding_service import EmbeddingService, embedding_service
 
 
+class DoesNotExist(Exception):
+    """Stands in for EmbeddingCache.DoesNotExist on the patched model"""
+
+
 class TestEmbeddingService(unittest.TestCase):
     """Comprehensive tests for EmbeddingService"""
     
     def setUp(self):
         """Set up test fixtures"""
+        # Building a real OpenAI client costs ~25ms and every test stubs the
+        # calls it needs, so hand the service a mock client instead
+        for client_class in ('OpenAI', 'AsyncOpenAI'):
+            client_patcher = patch(f'ai_integration.services.embedding_service.{client_class}')
+            mock_client_class = client_patcher.start()
+            self.addCleanup(client_patcher.stop)
         self.service = EmbeddingService()
         
+        # agenerate_embeddings_batch opens its own AsyncOpenAI per call
+        self.async_client = mock_client_class.return_value
+        self.async_client.__aenter__.return_value = self.async_client
+        
         # Mock logger to prevent output during tests
         logging.disable(logging.CRITICAL)
         
@@ -60,7 +79,7 @@ class TestEmbeddingService(unittest.TestCase):
         with patch('ai_integration.services.embedding_service.OpenAI') as mock_openai:
             service = EmbeddingService()
             
-            mock_openai.assert_called_once_with(api_key='test-api-key')
+            mock_openai.assert_called_once_with(api_key='test-api-key', max_retries=EmbeddingService.MAX_RETRIES)
             self.assertEqual(service.model, "text-embedding-3-small")
             
     def test_init_no_api_key(self):
@@ -69,7 +88,7 @@ class TestEmbeddingService(unittest.TestCase):
             with patch('ai_integration.services.embedding_service.OpenAI') as mock_openai:
                 service = EmbeddingService()
                 
-                mock_openai.assert_called_once_with(api_key='')
+                mock_openai.assert_called_once_with(api_key='', max_retries=EmbeddingService.MAX_RETRIES)
                 
     def test_generate_embedding_success(self):
         """Test successful embedding generation"""
@@ -105,14 +124,212 @@ class TestEmbeddingService(unittest.TestCase):
         
         self.assertIsNone(result)
         
-    def test_get_content_hash(self):
-        """Test content hash generation"""
-        text = "Hello, family!"
-        expected_hash = hashlib.sha256(text.encode('utf-8')).hexdigest()
+    def test_generate_embeddings_batch_success(self):
+        """Test batch embedding generation keeps results aligned with inputs"""
+        mock_response = Mock()
+        mock_response.data = [
+            Mock(index=0, embedding=[0.1, 0.2]),
+            Mock(index=1, embedding=[0.3, 0.4]),
+        ]
+        self.service.client.embeddings.create = Mock(return_value=mock_response)
+        
+        result = self.service.generate_embeddings_batch(["first", "", " second "])
+        
+        self.assertEqual(result, [[0.1, 0.2], None, [0.3, 0.4]])
+        self.service.client.embeddings.create.assert_called_once_with(
+            model="text-embedding-3-small",
+            input=["first", "second"]
+        )
+        
+    def test_generate_embeddings_batch_chunks_requests(self):
+        """Test batch embedding generation splits inputs into API-sized chunks"""
+        def create(model, input):
+            return Mock(data=[Mock(index=i, embedding=[float(i)]) for i in range(len(input))])
+        
+        self.service.client.embeddings.create = Mock(side_effect=create)
+        
+        with patch.object(EmbeddingService, 'MAX_BATCH_SIZE', 2):
+            result = self.service.generate_embeddings_batch(["a", "b", "c"])
+        
+        self.assertEqual(result, [[0.0], [1.0], [0.0]])
+        self.assertEqual(self.service.client.embeddings.create.call_count, 2)
+        
+    # Text placeholders stand in for vectors to check ordering
+    @patch.object(EmbeddingService, '_check_unit_norm')
+    def test_generate_embeddings_batch_deduplicates_texts(self, mock_check_unit_norm):
+        """Test repeated texts are sent once and fanned back out to every position"""
+        def create(model, input):
+            return Mock(data=[Mock(index=i, embedding=[text]) for i, text in enumerate(input)])
+        
+        self.service.client.embeddings.create = Mock(side_effect=create)
+        
+        result = self.service.generate_embeddings_batch(["a", "b", " a ", "", "b"])
+        
+        self.assertEqual(result, [["a"], ["b"], ["a"], None, ["b"]])
+        self.service.client.embeddings.create.assert_called_once_with(
+            model="text-embedding-3-small",
+            input=["a", "b"]
+        )
+        
+    def test_generate_embeddings_batch_exception(self):
+        """Test batch embedding generation when API call fails"""
+        self.service.client.embeddings.create = Mock(side_effect=Exception("API error"))
+        
+        result = self.service.generate_embeddings_batch(["a", "b"])
+        
+        self.assertEqual(result, [None, None])
+        
+    # Text placeholders stand in for vectors to check ordering
+    @patch.object(EmbeddingService, '_check_unit_norm')
+    def test_agenerate_embeddings_batch_concurrent(self, mock_check_unit_norm):
+        """Test async batch generation dispatches every chunk and keeps order"""
+        async def create(model, input):
+            return Mock(data=[Mock(index=i, embedding=[text]) for i, text in enumerate(input)])
+        
+        self.async_client.embeddings.create = Mock(side_effect=create)
+        
+        with patch.object(EmbeddingService, 'MAX_BATCH_SIZE', 2):
+            result = asyncio.run(self.service.agenerate_embeddings_batch(["a", "", "b", "c"]))
+        
+        self.assertEqual(result, [["a"], None, ["b"], ["c"]])
+        self.assertEqual(self.async_client.embeddings.create.call_count, 2)
         
-        result = self.service.get_content_hash(text)
+    def test_agenerate_embeddings_batch_partial_failure(self):
+        """Test async batch generation leaves failed chunks as None"""
+        async def create(model, input):
+            if input == ["b"]:
+                raise Exception("API error")
+            return Mock(data=[Mock(index=0, embedding=[0.1])])
+        
+        self.async_client.embeddings.create = Mock(side_effect=create)
+        
+        with patch.object(EmbeddingService, 'MAX_BATCH_SIZE', 1):
+            result = asyncio.run(self.service.agenerate_embeddings_batch(["a", "b"]))
+        
+        self.assertEqual(result, [[0.1], None])
+        
+    def test_agenerate_embeddings_batch_bounded_concurrency(self):
+        """Test async batch generation keeps at most MAX_CONCURRENT_REQUESTS in flight"""
+        in_flight = 0
+        peak = 0
+        
+        async def create(model, input):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0)
+            in_flight -= 1
+            return Mock(data=[Mock(index=0, embedding=[0.1])])
+        
+        self.async_client.embeddings.create = Mock(side_effect=create)
+        
+        with patch.object(EmbeddingService, 'MAX_BATCH_SIZE', 1):
+            with patch.object(EmbeddingService, 'MAX_CONCURRENT_REQUESTS', 2):
+                result = asyncio.run(self.service.agenerate_embeddings_batch(["a", "b", "c", "d", "e"]))
+        
+        self.assertEqual(result, [[0.1]] * 5)
+        self.assertEqual(peak, 2)
+        
+    def test_check_unit_norm(self):
+        """Test a non-unit response logs one warning per process"""
+        logging.disable(logging.NOTSET)
+        service_logger = 'ai_integration.services.embedding_service'
         
-        self.assertEqual(result, expected_hash)
+        with self.assertNoLogs(service_logger, level='WARNING'):
+            self.service._check_unit_norm([SimpleNamespace(embedding=[0.6, 0.8])])
+            self.service._check_unit_norm([])
+        
+        with self.assertLogs(service_logger, level='WARNING') as logs:
+            self.service._check_unit_norm([SimpleNamespace(embedding=[0.1, 0.2, 0.3])])
+            self.service._check_unit_norm([SimpleNamespace(embedding=[0.1, 0.2, 0.3])])
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn('squared norm 0.1400', logs.output[0])
+        
+    def test_generated_embeddings_are_norm_checked(self):
+        """Test the sync, batch and async paths check each API response once"""
+        data = [Mock(index=0, embedding=[1.0])]
+        self.service.client.embeddings.create = Mock(return_value=Mock(data=data))
+        
+        async def create(model, input):
+            return Mock(data=data)
+        
+        self.async_client.embeddings.create = Mock(side_effect=create)
+        
+        with patch.object(self.service, '_check_unit_norm') as mock_check:
+            self.service.generate_embedding("single")
+            self.service.generate_embeddings_batch(["batch"])
+            asyncio.run(self.service.agenerate_embeddings_batch(["async"]))
+        
+        self.assertEqual(mock_check.call_args_list, [call(data)] * 3)
+        
+    def test_generate_embedding_memory_cache(self):
+        """Test repeated texts are served from process memory without an API call"""
+        mock_response = Mock()
+        mock_response.data = [Mock(embedding=[0.1, 0.2, 0.3])]
+        self.service.client.embeddings.create = Mock(return_value=mock_response)
+        
+        first = self.service.generate_embedding("repeated query")
+        second = self.service.generate_embedding("  repeated query  ")
+        
+        self.assertEqual(first, [0.1, 0.2, 0.3])
+        self.assertEqual(second, [0.1, 0.2, 0.3])
+        self.service.client.embeddings.create.assert_called_once()
+        
+    def test_memory_cache_evicts_least_recently_used(self):
+        """Test the in-memory cache stays bounded and keeps recently used entries"""
+        with patch.object(EmbeddingService, 'MEMORY_CACHE_SIZE', 2):
+            self.service._memory_cache_put("a", [1.0])
+            self.service._memory_cache_put("b", [2.0])
+            self.service._memory_cache_get("a")
+            self.service._memory_cache_put("c", [3.0])
+        
+        self.assertEqual(self.service._memory_cache_get("a"), [1.0])
+        self.assertIsNone(self.service._memory_cache_get("b"))
+        self.assertEqual(self.service._memory_cache_get("c"), [3.0])
+        
+    def test_get_or_create_embedding_memory_cache_hit(self):
+        """Test get_or_create_embedding skips the database for embeddings held in memory"""
+        content_hash = self.service.get_content_hash("test text")
+        self.service._memory_cache_put(content_hash, [0.4, 0.5])
+        
+        with patch('ai_integration.services.embedding_service.EmbeddingCache') as mock_cache:
+            result = self.service.get_or_create_embedding("test text", "story", 1)
+            
+            self.assertEqual(result, [0.4, 0.5])
+            mock_cache.objects.get.assert_not_called()
+        
+    def test_memory_cache_shared_between_generate_and_get_or_create(self):
+        """Test both entry points use the same key for the same stripped text"""
+        mock_response = Mock()
+        mock_response.data = [Mock(embedding=[0.1, 0.2, 0.3])]
+        self.service.client.embeddings.create = Mock(return_value=mock_response)
+        
+        self.service.generate_embedding("shared text")
+        with patch('ai_integration.services.embedding_service.EmbeddingCache') as mock_cache:
+            result = self.service.get_or_create_embedding("shared text\n", "story", 1)
+        
+        self.assertEqual(result, [0.1, 0.2, 0.3])
+        mock_cache.objects.get.assert_not_called()
+        self.service.client.embeddings.create.assert_called_once()
+        
+    def test_clear_memory_cache(self):
+        """Test clear_memory_cache drops every in-memory embedding"""
+        self.service._memory_cache_put("a", [1.0])
+        
+        self.service.clear_memory_cache()
+        
+        self.assertIsNone(self.service._memory_cache_get("a"))
+        
+    def test_get_content_hash(self):
+        """Test content hashes match the SHA-256 digests already stored in the database"""
+        cases = [
+            ("Hello, family!", "a89c130c6768a11c56f5a1ba2f0d56e667662249fd19741b18c942ef33798633"),
+            ("爷爷的故事", "cc029a2fb55bbc2e87757b7aec0980f33b48d82d401e8848f0c46d9658a08412"),
+            ("", "e3b0c44298fc1c149afbf4c8996fb92427ae41e4649b934ca495991b7852b855"),
+        ]
+        for text, expected_hash in cases:
+            with self.subTest(text=text):
+                self.assertEqual(self.service.get_content_hash(text), expected_hash)
         
     def test_get_or_create_embedding_empty_text(self):
         """Test get_or_create_embedding with empty text"""
@@ -138,9 +355,6 @@ class TestEmbeddingService(unittest.TestCase):
     def test_get_or_create_embedding_generate_new(self):
         """Test generating new embedding when not in cache"""
         with patch('ai_integration.services.embedding_service.EmbeddingCache') as mock_cache:
-            # Create a proper exception class
-            class DoesNotExist(Exception):
-                pass
             mock_cache.DoesNotExist = DoesNotExist
             mock_cache.objects.get.side_effect = DoesNotExist
             
@@ -151,14 +365,11 @@ class TestEmbeddingService(unittest.TestCase):
                 
                 self.assertEqual(result, [0.4, 0.5, 0.6])
                 mock_generate.assert_called_once_with("test text")
-                mock_cache.objects.update_or_create.assert_called_once()
+                mock_cache.objects.bulk_create.assert_called_once()
                 
     def test_get_or_create_embedding_generate_failed(self):
         """Test when embedding generation fails"""
         with patch('ai_integration.services.embedding_service.EmbeddingCache') as mock_cache:
-            # Create a proper exception class
-            class DoesNotExist(Exception):
-                pass
             mock_cache.DoesNotExist = DoesNotExist
             mock_cache.objects.get.side_effect = DoesNotExist
             
@@ -168,7 +379,7 @@ class TestEmbeddingService(unittest.TestCase):
                 result = self.service.get_or_create_embedding("test text", "story", 1)
                 
                 self.assertIsNone(result)
-                mock_cache.objects.update_or_create.assert_not_called()
+                mock_cache.objects.bulk_create.assert_not_called()
                 
     def test_update_model_embedding_no_field(self):
         """Test update_model_embedding with model lacking content_embedding field"""
@@ -196,27 +407,26 @@ class TestEmbeddingService(unittest.TestCase):
         """Test update_model_embedding when embedding is already current"""
         mock_instance = Mock()
         mock_instance.content_embedding = [0.1, 0.2, 0.3]
-        mock_instance.embedding_updated = datetime.now()
+        mock_instance.embedding_updated = datetime(2023, 1, 1)
+        mock_instance.content_hash = self.service.get_content_hash("test content")
         mock_instance.id = 1
         
-        mock_cached = Mock()
-        mock_cached.embedding = [0.1, 0.2, 0.3]
-        
         with patch.object(self.service, '_extract_content_text') as mock_extract:
             mock_extract.return_value = "test content"
             
             with patch('ai_integration.services.embedding_service.EmbeddingCache') as mock_cache:
-                mock_cache.objects.get.return_value = mock_cached
-                
                 result = self.service.update_model_embedding(mock_instance, force_update=False)
                 
                 self.assertFalse(result)
+                # The stored hash decides freshness without touching the cache
+                mock_cache.objects.get.assert_not_called()
+                mock_instance.save.assert_not_called()
                 
     def test_update_model_embedding_force_update(self):
         """Test update_model_embedding with force_update=True"""
         mock_instance = Mock()
         mock_instance.content_embedding = [0.1, 0.2, 0.3]
-        mock_instance.embedding_updated = datetime.now()
+        mock_instance.embedding_updated = datetime(2023, 1, 1)
         mock_instance.id = 1
         type(mock_instance).__name__ = 'Story'
         
@@ -235,14 +445,14 @@ class TestEmbeddingService(unittest.TestCase):
                     self.assertEqual(mock_instance.content_embedding, [0.4, 0.5, 0.6])
                     self.assertEqual(mock_instance.embedding_updated, datetime(2023, 1, 1))
                     mock_instance.save.assert_called_once_with(
-                        update_fields=['content_embedding', 'embedding_updated']
+                        update_fields=['content_embedding', 'embedding_updated', 'content_hash']
                     )
                     
     def test_update_model_embedding_cache_miss(self):
         """Test update_model_embedding when cache check fails"""
         mock_instance = Mock()
         mock_instance.content_embedding = [0.1, 0.2, 0.3]
-        mock_instance.embedding_updated = datetime.now()
+        mock_instance.embedding_updated = datetime(2023, 1, 1)
         mock_instance.id = 1
         type(mock_instance).__name__ = 'Event'
         
@@ -250,9 +460,6 @@ class TestEmbeddingService(unittest.TestCase):
             mock_extract.return_value = "test content"
             
             with patch('ai_integration.services.embedding_service.EmbeddingCache') as mock_cache:
-                # Create a proper exception class
-                class DoesNotExist(Exception):
-                    pass
                 mock_cache.DoesNotExist = DoesNotExist
                 mock_cache.objects.get.side_effect = DoesNotExist
                 
@@ -264,6 +471,28 @@ class TestEmbeddingService(unittest.TestCase):
                     self.assertTrue(result)
                     self.assertEqual(mock_instance.content_embedding, [0.7, 0.8, 0.9])
                     
+    def test_update_model_embedding_hashes_content_once(self):
+        """Test update_model_embedding reuses one content hash for check and cache lookup"""
+        mock_instance = Mock()
+        mock_instance.content_embedding = [0.1, 0.2, 0.3]
+        mock_instance.embedding_updated = datetime(2023, 1, 1)
+        mock_instance.id = 1
+        type(mock_instance).__name__ = 'Story'
+        
+        with patch.object(self.service, '_extract_content_text', return_value="test content"):
+            with patch.object(self.service, 'get_content_hash', return_value="hash123") as mock_hash:
+                with patch('ai_integration.services.embedding_service.EmbeddingCache') as mock_cache:
+                    mock_cache.DoesNotExist = DoesNotExist
+                    mock_cache.objects.get.side_effect = DoesNotExist
+                    
+                    with patch.object(self.service, 'get_or_create_embedding') as mock_get_embedding:
+                        mock_get_embedding.return_value = [0.7, 0.8, 0.9]
+                        
+                        self.service.update_model_embedding(mock_instance)
+                        
+                        mock_hash.assert_called_once_with("test content")
+                        mock_get_embedding.assert_called_once_with("test content", "story", 1, "hash123")
+                    
     def test_update_model_embedding_generation_failed(self):
         """Test update_model_embedding when embedding generation fails"""
         mock_instance = Mock()
@@ -282,49 +511,23 @@ class TestEmbeddingService(unittest.TestCase):
                 self.assertFalse(result)
                 mock_instance.save.assert_not_called()
                 
-    def test_extract_content_text_story(self):
-        """Test _extract_content_text for Story model"""
-        mock_story = Mock()
-        type(mock_story).__name__ = 'Story'
-        mock_story.title = "Family Gathering"
-        mock_story.content = "It was a warm summer day..."
-        
-        result = self.service._extract_content_text(mock_story)
-        
-        self.assertEqual(result, "Family Gathering\n\nIt was a warm summer day...")
-        
-    def test_extract_content_text_event(self):
-        """Test _extract_content_text for Event model"""
-        mock_event = Mock()
-        type(mock_event).__name__ = 'Event'
-        mock_event.name = "Birthday Party"
-        mock_event.description = "Celebrated grandpa's 80th birthday"
-        
-        result = self.service._extract_content_text(mock_event)
-        
-        self.assertEqual(result, "Birthday Party\n\nCelebrated grandpa's 80th birthday")
-        
-    def test_extract_content_text_heritage(self):
-        """Test _extract_content_text for Heritage model"""
-        mock_heritage = Mock()
-        type(mock_heritage).__name__ = 'Heritage'
-        mock_heritage.title = "Family Recipe"
-        mock_heritage.description = "Grandma's secret dumpling recipe"
-        
-        result = self.service._extract_content_text(mock_heritage)
-        
-        self.assertEqual(result, "Family Recipe\n\nGrandma's secret dumpling recipe")
-        
-    def test_extract_content_text_health(self):
-        """Test _extract_content_text for Health model"""
-        mock_health = Mock()
-        type(mock_health).__name__ = 'Health'
-        mock_health.title = "Annual Checkup"
-        mock_health.description = "All results normal"
-        
-        result = self.service._extract_content_text(mock_health)
-        
-        self.assertEqual(result, "Annual Checkup\n\nAll results normal")
+    def test_extract_content_text_content_models(self):
+        """Test _extract_content_text joins the title and body of each content model"""
+        cases = [
+            ('Story', {'title': "Family Gathering", 'content': "It was a warm summer day..."},
+             "Family Gathering\n\nIt was a warm summer day..."),
+            ('Event', {'name': "Birthday Party", 'description': "Celebrated grandpa's 80th birthday"},
+             "Birthday Party\n\nCelebrated grandpa's 80th birthday"),
+            ('Heritage', {'title': "Family Recipe", 'description': "Grandma's secret dumpling recipe"},
+             "Family Recipe\n\nGrandma's secret dumpling recipe"),
+            ('Health', {'title': "Annual Checkup", 'description': "All results normal"},
+             "Annual Checkup\n\nAll results normal"),
+        ]
+        for model_name, fields, expected in cases:
+            with self.subTest(model=model_name):
+                instance = type(model_name, (SimpleNamespace,), {})(**fields)
+                
+                self.assertEqual(self.service._extract_content_text(instance), expected)
         
     def test_extract_content_text_person_with_bio(self):
         """Test _extract_content_text for Person model with bio"""
@@ -404,7 +607,7 @@ class TestEmbeddingService(unittest.TestCase):
         mock_model = Mock()
         mock_model.__name__ = 'TestModel'
         mock_queryset = Mock()
-        mock_queryset.count.return_value = 0
+        mock_queryset.iterator.return_value = iter([])
         mock_model.objects.filter.return_value = mock_queryset
         
         result = self.service.bulk_update_embeddings(mock_model)
@@ -424,18 +627,27 @@ class TestEmbeddingService(unittest.TestCase):
         mock_instance3.id = 3
         
         mock_queryset = Mock()
-        mock_queryset.count.return_value = 3
-        mock_queryset.__getitem__ = Mock(side_effect=lambda s: [mock_instance1, mock_instance2, mock_instance3][s])
+        mock_queryset.iterator.return_value = iter([mock_instance1, mock_instance2, mock_instance3])
         mock_model.objects.filter.return_value = mock_queryset
         
-        with patch.object(self.service, 'update_model_embedding') as mock_update:
-            # First succeeds, second skipped, third succeeds
-            mock_update.side_effect = [True, False, True]
-            
-            result = self.service.bulk_update_embeddings(mock_model, batch_size=2)
-            
-            self.assertEqual(result, {'updated': 2, 'skipped': 1, 'failed': 0})
-            self.assertEqual(mock_update.call_count, 3)
+        texts = {1: "text 1", 2: "", 3: "text 3"}
+        cached_hash = self.service.get_content_hash("text 1")
+        
+        with patch.object(self.service, '_extract_content_text', side_effect=lambda inst: texts[inst.id]):
+            with patch('ai_integration.services.embedding_service.EmbeddingCache') as mock_cache:
+                # First is a cache hit, second has no text, third is generated
+                mock_cache.objects.filter.return_value.values_list.return_value = [(cached_hash, [0.1])]
+                
+                with patch.object(self.service, 'agenerate_embeddings_batch', return_value=[[0.3]]) as mock_generate:
+                    result = self.service.bulk_update_embeddings(mock_model, batch_size=2)
+                    
+                    self.assertEqual(result, {'updated': 2, 'skipped': 1, 'failed': 0})
+                    mock_generate.assert_called_once_with(["text 3"])
+                    self.assertEqual(mock_instance1.content_embedding, [0.1])
+                    self.assertEqual(mock_instance3.content_embedding, [0.3])
+                    self.assertEqual(mock_model.objects.bulk_update.call_count, 2)
+                    mock_queryset.iterator.assert_called_once_with(chunk_size=2)
+                    mock_cache.objects.bulk_create.assert_called_once()
             
     def test_bulk_update_embeddings_with_failures(self):
         """Test bulk_update_embeddings with some failures"""
@@ -448,17 +660,95 @@ class TestEmbeddingService(unittest.TestCase):
         mock_instance2.id = 2
         
         mock_queryset = Mock()
-        mock_queryset.count.return_value = 2
-        mock_queryset.__getitem__ = Mock(side_effect=lambda s: [mock_instance1, mock_instance2][s])
+        mock_queryset.iterator.return_value = iter([mock_instance1, mock_instance2])
         mock_model.objects.filter.return_value = mock_queryset
         
-        with patch.object(self.service, 'update_model_embedding') as mock_update:
-            # First succeeds, second raises exception
-            mock_update.side_effect = [True, Exception("Update failed")]
+        with patch.object(self.service, '_extract_content_text', side_effect=lambda inst: f"text {inst.id}"):
+            with patch('ai_integration.services.embedding_service.EmbeddingCache') as mock_cache:
+                mock_cache.objects.filter.return_value.values_list.return_value = []
+                
+                # First succeeds, second gets no embedding back
+                with patch.object(self.service, 'agenerate_embeddings_batch', return_value=[[0.1], None]):
+                    result = self.service.bulk_update_embeddings(mock_model, batch_size=10)
+                    
+                    self.assertEqual(result, {'updated': 1, 'skipped': 0, 'failed': 1})
+                    mock_model.objects.bulk_update.assert_called_once_with(
+                        [mock_instance1], ['content_embedding', 'embedding_updated', 'content_hash']
+                    )
             
-            result = self.service.bulk_update_embeddings(mock_model, batch_size=10)
+    def test_bulk_update_embeddings_stale(self):
+        """Test stale mode scans every row and re-embeds only edited ones"""
+        mock_model = Mock()
+        mock_model.__name__ = 'TestModel'
+        
+        fresh = Mock(id=1, embedding_updated=datetime(2023, 1, 1),
+                     content_hash=self.service.get_content_hash("text 1"))
+        edited = Mock(id=2, embedding_updated=datetime(2023, 1, 1),
+                      content_hash=self.service.get_content_hash("old text 2"))
+        
+        mock_queryset = Mock()
+        mock_queryset.iterator.return_value = iter([fresh, edited])
+        mock_model.objects.all.return_value = mock_queryset
+        
+        with patch.object(self.service, '_extract_content_text', side_effect=lambda inst: f"text {inst.id}"):
+            with patch('ai_integration.services.embedding_service.EmbeddingCache') as mock_cache:
+                mock_cache.objects.filter.return_value.values_list.return_value = []
+                
+                with patch.object(self.service, 'agenerate_embeddings_batch', return_value=[[0.2]]) as mock_generate:
+                    result = self.service.bulk_update_embeddings(mock_model, batch_size=10, stale=True)
+                    
+                    self.assertEqual(result, {'updated': 1, 'skipped': 1, 'failed': 0})
+                    mock_generate.assert_called_once_with(["text 2"])
+                    mock_model.objects.filter.assert_not_called()
+            
+    def test_bulk_update_embeddings_inside_event_loop(self):
+        """Test bulk updates fall back to sync requests when a loop is already running"""
+        mock_model = Mock()
+        mock_model.__name__ = 'TestModel'
+        
+        mock_instance = Mock()
+        mock_instance.id = 1
+        
+        mock_queryset = Mock()
+        mock_queryset.iterator.return_value = iter([mock_instance])
+        mock_model.objects.filter.return_value = mock_queryset
+        
+        async def run_from_async_code():
+            return self.service.bulk_update_embeddings(mock_model, batch_size=10)
+        
+        with patch.object(self.service, '_extract_content_text', return_value="text"):
+            with patch('ai_integration.services.embedding_service.EmbeddingCache') as mock_cache:
+                mock_cache.objects.filter.return_value.values_list.return_value = []
+                
+                with patch.object(self.service, 'generate_embeddings_batch', return_value=[[0.1]]) as mock_generate:
+                    with patch.object(self.service, 'agenerate_embeddings_batch') as mock_agenerate:
+                        result = asyncio.run(run_from_async_code())
+                        
+                        self.assertEqual(result, {'updated': 1, 'skipped': 0, 'failed': 0})
+                        mock_generate.assert_called_once_with(["text"])
+                        mock_agenerate.assert_not_called()
             
-            self.assertEqual(result, {'updated': 1, 'skipped': 0, 'failed': 1})
+    def test_bulk_update_embeddings_batch_exception(self):
+        """Test bulk_update_embeddings counts a batch as failed when it raises"""
+        mock_model = Mock()
+        mock_model.__name__ = 'TestModel'
+        
+        mock_instance1 = Mock()
+        mock_instance1.id = 1
+        mock_instance2 = Mock()
+        mock_instance2.id = 2
+        
+        mock_queryset = Mock()
+        mock_queryset.iterator.return_value = iter([mock_instance1, mock_instance2])
+        mock_model.objects.filter.return_value = mock_queryset
+        
+        with patch.object(self.service, '_extract_content_text', return_value="text"):
+            with patch('ai_integration.services.embedding_service.EmbeddingCache') as mock_cache:
+                mock_cache.objects.filter.side_effect = Exception("DB error")
+                
+                result = self.service.bulk_update_embeddings(mock_model, batch_size=10)
+                
+                self.assertEqual(result, {'updated': 0, 'skipped': 0, 'failed': 2})
             
     def test_global_service_instance(self):
         """Test that global service instance is created"""
@@ -466,5 +756,57 @@ class TestEmbeddingService(unittest.TestCase):
         self.assertIsNotNone(embedding_service.client)
 
 
+
+class StubEmbeddingsHandler(BaseHTTPRequestHandler):
+    """Answers /embeddings with unit vectors over a keep-alive connection"""
+    
+    protocol_version = 'HTTP/1.1'
+    
+    def do_POST(self):
+        inputs = json.loads(self.rfile.read(int(self.headers['Content-Length'])))['input']
+        body = json.dumps({
+            'object': 'list',
+            'model': 'text-embedding-3-small',
+            'data': [
+                {'object': 'embedding', 'index': i, 'embedding': [1.0, 0.0]}
+                for i in range(len(inputs))
+            ],
+            'usage': {'prompt_tokens': 1, 'total_tokens': 1},
+        }).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, format, *args):
+        pass
+
+
+class TestAsyncEmbeddingsAcrossEventLoops(unittest.TestCase):
+    """Run async batches through a real client against a local stub server"""
+    
+    def setUp(self):
+        server = ThreadingHTTPServer(('127.0.0.1', 0), StubEmbeddingsHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        
+        self.service = EmbeddingService()
+        self.service.client = OpenAI(
+            api_key='test-api-key',
+            base_url=f'http://127.0.0.1:{server.server_port}/v1',
+            max_retries=0
+        )
+        
+    def test_batches_on_separate_event_loops(self):
+        """Test each asyncio.run batch gets a working client, as bulk updates do"""
+        first = asyncio.run(self.service.agenerate_embeddings_batch(["a", "b"]))
+        second = asyncio.run(self.service.agenerate_embeddings_batch(["c"]))
+        
+        self.assertEqual(first, [[1.0, 0.0], [1.0, 0.0]])
+        self.assertEqual(second, [[1.0, 0.0]])
+
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -3,8 +3,10 @@ Comprehensive AI Integration Tests
 Tests the complete AI pipeline using pytest fixtures and mocks
 """
 import pytest
+from datetime import datetime
+from types import SimpleNamespace
 from unittest.mock import patch, Mock, MagicMock
-from django.test import TestCase, RequestFactory
+from django.test import SimpleTestCase, TestCase, RequestFactory
 from django.contrib.auth.models import User
 import json
 
@@ -18,22 +20,18 @@ from ai_integration.views import chat_endpoint, semantic_search
 class AIIntegrationTestCase(TestCase):
     """Base test case with common setup for AI components"""
     
-    def setUp(self):
-        self.factory = RequestFactory()
-        self.user = User.objects.create_user(
+    @classmethod
+    def setUpTestData(cls):
+        # Created once per class; each test runs in a rolled-back transaction
+        cls.factory = RequestFactory()
+        cls.user = User.objects.create_user(
             username='testuser',
             email='test@example.com',
             password='testpass123'
         )
-        
-    def tearDown(self):
-        # Clean up test data
-        ChatSession.objects.all().delete()
-        QueryLog.objects.all().delete()
-        EmbeddingCache.objects.all().delete()
 
 
-class TestEmbeddingService(AIIntegrationTestCase):
+class TestEmbeddingService(SimpleTestCase):
     """Test embedding service functionality"""
     
     def test_content_hash_generation(self):
@@ -48,21 +46,21 @@ class TestEmbeddingService(AIIntegrationTestCase):
     
     def test_content_extraction(self):
         """Test content extraction from different model types"""
-        # Mock Story model
-        mock_story = Mock()
-        mock_story.__class__.__name__ = 'Story'
-        mock_story.title = 'Test Story'
-        mock_story.content = 'Test content about family'
+        # Stand-in Story model
+        mock_story = type('Story', (SimpleNamespace,), {})(
+            title='Test Story',
+            content='Test content about family'
+        )
         
         extracted = embedding_service._extract_content_text(mock_story)
         self.assertIn('Test Story', extracted)
         self.assertIn('Test content', extracted)
         
-        # Mock Event model
-        mock_event = Mock()
-        mock_event.__class__.__name__ = 'Event'
-        mock_event.name = 'Test Event'
-        mock_event.description = 'Test event description'
+        # Stand-in Event model
+        mock_event = type('Event', (SimpleNamespace,), {})(
+            name='Test Event',
+            description='Test event description'
+        )
         
         extracted = embedding_service._extract_content_text(mock_event)
         self.assertIn('Test Event', extracted)
@@ -80,7 +78,7 @@ class TestEmbeddingService(AIIntegrationTestCase):
         mock_generate.assert_called_once_with('Test content')
 
 
-class TestSearchService(AIIntegrationTestCase):
+class TestSearchService(SimpleTestCase):
     """Test search service functionality"""
     
     def test_searchable_models_configuration(self):
@@ -92,24 +90,23 @@ class TestSearchService(AIIntegrationTestCase):
     
     def test_result_formatting(self):
         """Test search result formatting"""
-        mock_result = Mock()
-        mock_result.__class__.__name__ = 'Story'
-        mock_result.id = 1
-        mock_result.title = 'Mock Story'
-        mock_result.content = 'A' * 300  # Long content for truncation test
-        mock_result.similarity = 0.85
-        mock_result.created_at = '2024-01-01T00:00:00Z'
-        
-        try:
-            formatted = search_service._format_search_result(mock_result)
-            self.assertIn('title', formatted)
-            self.assertIn('content', formatted)
-            self.assertIn('similarity', formatted)
-            # Check content truncation
-            self.assertLessEqual(len(formatted['content']), 203)  # 200 + '...'
-        except AttributeError:
-            # Some fields might not exist in mock - that's okay for this test
-            pass
+        mock_result = type('Story', (SimpleNamespace,), {})(
+            id=1,
+            title='Mock Story',
+            content='A' * 300,  # Long content for truncation test
+            story_type='memory',
+            date_occurred=None,
+            people=SimpleNamespace(all=lambda: []),
+            similarity=0.85,
+            created_at=datetime(2024, 1, 1)
+        )
+        
+        formatted = search_service._format_search_result(mock_result)
+        self.assertIn('title', formatted)
+        self.assertIn('content', formatted)
+        self.assertIn('similarity', formatted)
+        # Check content truncation
+        self.assertLessEqual(len(formatted['content']), 203)  # 200 + '...'
     
     @patch.object(search_service, 'semantic_search')
     def test_semantic_search_mock(self, mock_search):
@@ -131,7 +128,7 @@ class TestSearchService(AIIntegrationTestCase):
         self.assertEqual(results[0]['similarity'], 0.9)
 
 
-class TestRAGService(AIIntegrationTestCase):
+class TestRAGService(SimpleTestCase):
     """Test RAG service functionality"""
     
     def test_query_classification(self):
@@ -146,13 +143,14 @@ class TestRAGService(AIIntegrationTestCase):
         ]
         
         for query, expected_type in test_cases:
-            actual_type = rag_service._classify_query(query)
-            # Allow some flexibility in classification
-            self.assertIsInstance(actual_type, str)
-            self.assertIn(actual_type, [
-                'memory_discovery', 'health_pattern', 'event_planning',
-                'cultural_heritage', 'relationship_discovery', 'general'
-            ])
+            with self.subTest(query=query):
+                actual_type = rag_service._classify_query(query)
+                # Allow some flexibility in classification
+                self.assertIsInstance(actual_type, str)
+                self.assertIn(actual_type, [
+                    'memory_discovery', 'health_pattern', 'event_planning',
+                    'cultural_heritage', 'relationship_discovery', 'general'
+                ])
     
     def test_language_detection(self):
         """Test language detection functionality"""
@@ -191,10 +189,9 @@ class TestRAGService(AIIntegrationTestCase):
         ]
         
         # Mock Anthropic response
-        mock_response = Mock()
-        mock_response.content = [Mock()]
-        mock_response.content[0].text = 'Test AI response'
-        mock_anthropic.messages.create.return_value = mock_response
+        mock_anthropic.messages.create.return_value = SimpleNamespace(
+            content=[SimpleNamespace(text='Test AI response')]
+        )
         
         result = rag_service.generate_response('Tell me about family traditions')
         
@@ -240,6 +237,35 @@ class TestAPIEndpoints(AIIntegrationTestCase):
         self.assertIn('sources', response_data)
         self.assertIn('metadata', response_data)
     
+    @patch.object(rag_service, 'generate_response')
+    def test_chat_endpoint_query_count(self, mock_rag):
+        """Test logging a chat turn costs one session lookup and one insert"""
+        mock_rag.return_value = {
+            'query': 'test query',
+            'response': 'test response',
+            'sources': [],
+            'metadata': {
+                'query_type': 'general',
+                'confidence': 0.8,
+                'processing_time': 1.0,
+                'sources_count': 0,
+                'language': 'en-US'
+            }
+        }
+        ChatSession.objects.create(user=self.user, session_id='query-count-session')
+        
+        request = self.factory.post(
+            '/api/ai/chat/',
+            data=json.dumps({'query': 'test query', 'session_id': 'query-count-session'}),
+            content_type='application/json'
+        )
+        
+        with self.assertNumQueries(2):
+            response = chat_endpoint(request)
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(QueryLog.objects.filter(session__session_id='query-count-session').count(), 1)
+    
     @patch.object(search_service, 'semantic_search')
     def test_search_endpoint(self, mock_search):
         """Test search API endpoint"""
@@ -382,34 +408,34 @@ class TestModelIntegration(AIIntegrationTestCase):
 
 
 # Performance and error handling tests
-class TestAIPerformance(AIIntegrationTestCase):
+class TestAIPerformance(SimpleTestCase):
     """Test performance and error handling"""
     
     def test_service_initialization_performance(self):
-        """Test that services initialize quickly"""
-        import time
-        
-        start_time = time.time()
-        # Test service imports and basic operations
-        embedding_service.get_content_hash('test')
-        search_service.SEARCHABLE_MODELS
-        rag_service._detect_language('test')
-        end_time = time.time()
-        
-        # Should initialize very quickly
-        self.assertLess(end_time - start_time, 0.1, 'Service initialization too slow')
+        """Test that basic service operations stay local and never call the AI APIs"""
+        with patch.object(embedding_service, 'client') as mock_openai, \
+             patch.object(rag_service, 'anthropic_client') as mock_anthropic:
+            content_hash = embedding_service.get_content_hash('test')
+            searchable_models = search_service.SEARCHABLE_MODELS
+            language = rag_service._detect_language('test')
+        
+        self.assertEqual(len(content_hash), 64)
+        self.assertEqual(len(searchable_models), 4)
+        self.assertEqual(language, 'en-US')
+        self.assertEqual(mock_openai.mock_calls, [])
+        self.assertEqual(mock_anthropic.mock_calls, [])
     
     @patch.object(rag_service, 'anthropic_client')
     def test_error_handling(self, mock_anthropic):
         """Test error handling in RAG service"""
-        # Mock API failure
-        mock_anthropic.messages.create.side_effect = Exception('API Error')
-        
-        with patch.object(search_service, 'semantic_search', return_value=[]):
+        # Mock search failure; Anthropic failures fall back inside
+        # _generate_ai_response, so only earlier steps reach the error path
+        with patch.object(search_service, 'semantic_search', side_effect=Exception('Search unavailable')):
             result = rag_service.generate_response('test query')
             
             # Should return error response structure
             self.assertIn('query', result)
             self.assertIn('response', result)
             self.assertIn('metadata', result)
-            self.assertEqual(result['metadata']['query_type'], 'error')
\ No newline at end of file
+            self.assertEqual(result['metadata']['query_type'], 'error')
+            self.assertEqual(mock_anthropic.mock_calls, [])
\ No newline at end of file
@@ -6,9 +6,62 @@ import pytest
 from unittest.mock import patch, Mock, MagicMock
 import json
 import hashlib
+import re
 
 # No Django model imports - only test pure business logic
 
+# Keyword sets checked in priority order by _classify_query
+QUERY_TYPE_KEYWORDS = (
+    ('health_pattern', frozenset(['health', 'medical', 'illness', 'disease', 'hereditary', 'genetic', '健康', '疾病', '遗传'])),
+    ('event_planning', frozenset(['celebration', 'party', 'reunion', 'birthday', 'wedding', '庆祝', '聚会', '生日'])),
+    ('cultural_heritage', frozenset(['tradition', 'heritage', 'recipe', 'values', 'wisdom', '传统', '文化', '智慧'])),
+    ('relationship_discovery', frozenset(['family', 'relative', 'relationship', 'cousin', '亲戚', '家人', '关系'])),
+    ('memory_discovery', frozenset(['story', 'stories', 'memory', 'remember', 'childhood', 'past', '故事', '回忆', '童年'])),
+)
+
+KEYWORD_QUERY_TYPES = {
+    keyword: query_type
+    for query_type, keywords in reversed(QUERY_TYPE_KEYWORDS)
+    for keyword in keywords
+}
+# Zero-width lookahead so overlapping keywords are all reported in one scan
+QUERY_KEYWORDS_RE = re.compile(
+    '(?=(' + '|'.join(re.escape(keyword) for keyword in KEYWORD_QUERY_TYPES) + '))'
+)
+
+
+def _classify_query(query: str) -> str:
+    """Mock the query classification logic"""
+    matched = {KEYWORD_QUERY_TYPES[m.group(1)] for m in QUERY_KEYWORDS_RE.finditer(query.lower())}
+    for query_type, _ in QUERY_TYPE_KEYWORDS:
+        if query_type in matched:
+            return query_type
+    return 'general'
+
+
+def _detect_language(query: str) -> str:
+    """Mock the language detection logic"""
+    # Check for Chinese characters
+    chinese_chars = sum(1 for char in query if '\u4e00' <= char <= '\u9fff')
+    if chinese_chars > len(query) * 0.3:  # More than 30% Chinese characters
+        return 'zh-CN'
+    return 'en-US'
+
+
+def _calculate_confidence(search_results: list) -> float:
+    """Mock the confidence calculation logic"""
+    if not search_results:
+        return 0.0
+    
+    # Average similarity of top 3 results
+    top_similarities = [r.get('similarity', 0) for r in search_results[:3]]
+    avg_similarity = sum(top_similarities) / len(top_similarities)
+    
+    # Boost confidence if we have multiple good results
+    count_boost = min(len(search_results) * 0.1, 0.2)
+    
+    return min(avg_similarity + count_boost, 1.0)
+
 
 class TestHashingLogic:
     """Test content hashing logic without any external dependencies"""
@@ -70,122 +123,49 @@ class TestContentExtractionLogic:
 class TestQueryClassificationLogic:
     """Test query classification algorithms"""
     
-    def test_query_classification_algorithm(self):
+    @pytest.mark.parametrize('query,expected', [
+        ('Tell me stories', 'memory_discovery'),  # Removed "family" to avoid classification conflict
+        ('家庭健康记录', 'health_pattern'),
+        ('celebration planning', 'event_planning'),
+        ('traditional recipes', 'cultural_heritage'),
+        ('family relationships', 'relationship_discovery'),
+        ('general question', 'general'),
+        ('My childhood memories', 'memory_discovery'),
+        ('传统智慧', 'cultural_heritage'),
+        ('family health history', 'health_pattern'),  # Earlier type wins, not earlier keyword
+    ])
+    def test_query_classification_algorithm(self, query, expected):
         """Test query type classification logic"""
-        def classify_query(query: str) -> str:
-            """Mock the query classification logic"""
-            query_lower = query.lower()
-            
-            # Health-related keywords
-            health_keywords = ['health', 'medical', 'illness', 'disease', 'hereditary', 'genetic', '健康', '疾病', '遗传']
-            if any(keyword in query_lower for keyword in health_keywords):
-                return 'health_pattern'
-            
-            # Event planning keywords
-            event_keywords = ['celebration', 'party', 'reunion', 'birthday', 'wedding', '庆祝', '聚会', '生日']
-            if any(keyword in query_lower for keyword in event_keywords):
-                return 'event_planning'
-            
-            # Heritage/tradition keywords
-            heritage_keywords = ['tradition', 'heritage', 'recipe', 'values', 'wisdom', '传统', '文化', '智慧']
-            if any(keyword in query_lower for keyword in heritage_keywords):
-                return 'cultural_heritage'
-            
-            # Relationship keywords
-            relationship_keywords = ['family', 'relative', 'relationship', 'cousin', '亲戚', '家人', '关系']
-            if any(keyword in query_lower for keyword in relationship_keywords):
-                return 'relationship_discovery'
-            
-            # Memory/story keywords
-            memory_keywords = ['story', 'stories', 'memory', 'remember', 'childhood', 'past', '故事', '回忆', '童年']
-            if any(keyword in query_lower for keyword in memory_keywords):
-                return 'memory_discovery'
-            
-            return 'general'
-        
-        test_cases = [
-            ('Tell me stories', 'memory_discovery'),  # Removed "family" to avoid classification conflict
-            ('家庭健康记录', 'health_pattern'),
-            ('celebration planning', 'event_planning'),
-            ('traditional recipes', 'cultural_heritage'),
-            ('family relationships', 'relationship_discovery'),
-            ('general question', 'general'),
-            ('My childhood memories', 'memory_discovery'),
-            ('传统智慧', 'cultural_heritage')
-        ]
-        
-        for query, expected_type in test_cases:
-            actual_type = classify_query(query)
-            assert actual_type == expected_type, f"Query '{query}' classified as '{actual_type}', expected '{expected_type}'"
+        assert _classify_query(query) == expected
 
 
 class TestLanguageDetectionLogic:
     """Test language detection algorithms"""
     
-    def test_language_detection_algorithm(self):
+    @pytest.mark.parametrize('query,expected', [
+        ('这是中文查询测试', 'zh-CN'),
+        ('This is an English query test', 'en-US'),
+        ('Hello 你好世界', 'zh-CN'),  # Mixed content, more Chinese characters
+        ('Hello 你', 'en-US'),  # Less than 30% Chinese
+    ])
+    def test_language_detection_algorithm(self, query, expected):
         """Test language detection logic"""
-        def detect_language(query: str) -> str:
-            """Mock the language detection logic"""
-            # Check for Chinese characters
-            chinese_chars = sum(1 for char in query if '\u4e00' <= char <= '\u9fff')
-            if chinese_chars > len(query) * 0.3:  # More than 30% Chinese characters
-                return 'zh-CN'
-            return 'en-US'
-        
-        # Test Chinese detection
-        chinese_result = detect_language('这是中文查询测试')
-        assert chinese_result == 'zh-CN'
-        
-        # Test English detection
-        english_result = detect_language('This is an English query test')
-        assert english_result == 'en-US'
-        
-        # Test mixed content (should favor language with more characters)
-        mixed_result = detect_language('Hello 你好世界')
-        assert mixed_result == 'zh-CN'  # More Chinese characters
-        
-        # Test edge case
-        minimal_chinese = detect_language('Hello 你')
-        assert minimal_chinese == 'en-US'  # Less than 30% Chinese
+        assert _detect_language(query) == expected
 
 
 class TestConfidenceCalculationLogic:
     """Test confidence calculation algorithms"""
     
-    def test_confidence_calculation_algorithm(self):
+    @pytest.mark.parametrize('results,low,high', [
+        ([{'similarity': 0.9}, {'similarity': 0.8}, {'similarity': 0.7}], 0.8, 1.0),
+        ([], 0.0, 0.0),
+        ([{'similarity': 0.5}], 0.5, 0.7),
+    ])
+    def test_confidence_calculation_algorithm(self, results, low, high):
         """Test confidence scoring logic"""
-        def calculate_confidence(search_results: list) -> float:
-            """Mock the confidence calculation logic"""
-            if not search_results:
-                return 0.0
-            
-            # Average similarity of top 3 results
-            top_similarities = [r.get('similarity', 0) for r in search_results[:3]]
-            avg_similarity = sum(top_similarities) / len(top_similarities)
-            
-            # Boost confidence if we have multiple good results
-            count_boost = min(len(search_results) * 0.1, 0.2)
-            
-            return min(avg_similarity + count_boost, 1.0)
-        
-        # Test with good results
-        good_results = [
-            {'similarity': 0.9},
-            {'similarity': 0.8},
-            {'similarity': 0.7}
-        ]
-        confidence = calculate_confidence(good_results)
+        confidence = _calculate_confidence(results)
         assert isinstance(confidence, float)
-        assert 0.8 <= confidence <= 1.0
-        
-        # Test with empty results
-        empty_confidence = calculate_confidence([])
-        assert empty_confidence == 0.0
-        
-        # Test with single result
-        single_result = [{'similarity': 0.5}]
-        single_confidence = calculate_confidence(single_result)
-        assert 0.5 <= single_confidence <= 0.7
+        assert low <= confidence <= high
 
 
 class TestAPIResponseFormatting:
@@ -324,7 +304,7 @@ class TestErrorHandling:
 class TestPerformanceLogic:
     """Test performance-related logic"""
     
-    def test_processing_time_calculation(self):
+    def test_processing_time_calculation(self, monkeypatch):
         """Test processing time calculation"""
         import time
         
@@ -332,13 +312,15 @@ class TestPerformanceLogic:
             """Mock processing time calculation"""
             return round(time.time() - start_time, 2)
         
+        # Fake clock: the call after start reads 123ms later
+        clock = iter([1000.0, 1000.123])
+        monkeypatch.setattr(time, 'time', lambda: next(clock))
+        
         start = time.time()
-        time.sleep(0.1)  # Simulate some processing
         processing_time = calculate_processing_time(start)
         
         assert isinstance(processing_time, float)
-        assert processing_time >= 0.1
-        assert processing_time < 1.0  # Should be under 1 second for this test
+        assert processing_time == 0.12
     
     def test_content_truncation_logic(self):
         """Test content truncation for performance"""
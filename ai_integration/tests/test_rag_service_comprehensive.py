@@ -402,6 +402,18 @@ class TestRAGService:
         assert result['metadata']['sources_count'] == 0
         assert "couldn't find" in result['response']
     
+    @patch('ai_integration.services.rag_service.search_service')
+    def test_generate_response_detects_language_once(self, mock_search_service):
+        """Test the detected language is reused for the fallback and metadata"""
+        mock_search_service.semantic_search.return_value = []
+        
+        with patch.object(self.rag_service, '_detect_language', return_value='zh-CN') as mock_detect:
+            result = self.rag_service.generate_response('家庭故事')
+            
+            mock_detect.assert_called_once_with('家庭故事')
+            assert result['metadata']['language'] == 'zh-CN'
+            assert '很抱歉' in result['response']
+    
     @patch('ai_integration.services.rag_service.search_service')
     def test_generate_response_exception(self, mock_search_service):
         """Test response generation with exception"""
@@ -103,7 +103,7 @@ class TestSearchService(unittest.TestCase):
         
         with patch.object(self.service, '_search_model') as mock_search:
             # Configure mock to return different results for different models
-            def side_effect(model_class, *args):
+            def side_effect(model_class, *args, **kwargs):
                 if model_class.__name__ == 'Story':
                     return mock_story_results
                 elif model_class.__name__ == 'Event':
@@ -149,6 +149,108 @@ class TestSearchService(unittest.TestCase):
             mock_search.assert_not_called()
             self.assertEqual(results, [])
             
+    def test_semantic_search_multi_batches_embeddings(self):
+        """Test semantic_search_multi embeds all queries in one batch call"""
+        self.mock_embedding_service.generate_embeddings_batch.return_value = [
+            [0.1, 0.2, 0.3],
+            [0.4, 0.5, 0.6],
+        ]
+        
+        with patch.object(self.service, '_search_model') as mock_search:
+            mock_search.side_effect = lambda model_class, embedding, *args, **kwargs: [
+                {'id': 1, 'title': model_class.__name__, 'similarity': embedding[0]}
+            ]
+            
+            results = self.service.semantic_search_multi(["query one", "query two"], model_types=['story'])
+            
+            self.mock_embedding_service.generate_embeddings_batch.assert_called_once_with(
+                ["query one", "query two"]
+            )
+            self.mock_embedding_service.generate_embedding.assert_not_called()
+            self.assertEqual(len(results), 2)
+            self.assertEqual(results[0][0]['similarity'], 0.1)
+            self.assertEqual(results[1][0]['similarity'], 0.4)
+            self.assertEqual(results[1][0]['content_type'], 'story')
+            
+    def test_semantic_search_multi_failed_embedding(self):
+        """Test semantic_search_multi returns empty results for failed queries"""
+        self.mock_embedding_service.generate_embeddings_batch.return_value = [None, [0.1, 0.2, 0.3]]
+        
+        with patch.object(self.service, '_search_model', return_value=[]) as mock_search:
+            results = self.service.semantic_search_multi(["", "query"], model_types=['story'])
+            
+            self.assertEqual(results, [[], []])
+            self.assertEqual(mock_search.call_count, 1)
+            
+    def test_hnsw_ef_search_widened_for_large_limit(self):
+        """Test ef_search is raised inside a transaction when the limit needs more candidates"""
+        with patch('ai_integration.services.search_service.connection') as mock_connection, \
+             patch('ai_integration.services.search_service.transaction') as mock_transaction:
+            mock_connection.vendor = 'postgresql'
+            mock_connection.in_atomic_block = False
+            cursor = mock_connection.cursor.return_value.__enter__.return_value
+            
+            with self.service._hnsw_ef_search(50):
+                mock_transaction.atomic.return_value.__enter__.assert_called_once()
+            
+            cursor.execute.assert_called_once_with('SET LOCAL hnsw.ef_search = %s', [200])
+            
+    def test_hnsw_ef_search_restored_inside_outer_transaction(self):
+        """Test the caller's ef_search is put back when only a savepoint was opened"""
+        with patch('ai_integration.services.search_service.connection') as mock_connection, \
+             patch('ai_integration.services.search_service.transaction'):
+            mock_connection.vendor = 'postgresql'
+            mock_connection.in_atomic_block = True
+            cursor = mock_connection.cursor.return_value.__enter__.return_value
+            cursor.fetchone.return_value = ('40',)
+            
+            with self.service._hnsw_ef_search(50):
+                cursor.execute.assert_called_with('SET LOCAL hnsw.ef_search = %s', [200])
+            
+            cursor.execute.assert_has_calls([
+                call("SELECT current_setting('hnsw.ef_search', true)"),
+                call('SET LOCAL hnsw.ef_search = %s', [200]),
+                call('SET LOCAL hnsw.ef_search = %s', ['40']),
+            ])
+            
+    def test_hnsw_ef_search_reset_when_previously_unset(self):
+        """Test ef_search is reset to its default when the vector library was not loaded yet"""
+        with patch('ai_integration.services.search_service.connection') as mock_connection, \
+             patch('ai_integration.services.search_service.transaction'):
+            mock_connection.vendor = 'postgresql'
+            mock_connection.in_atomic_block = True
+            cursor = mock_connection.cursor.return_value.__enter__.return_value
+            cursor.fetchone.return_value = (None,)
+            
+            with self.service._hnsw_ef_search(50):
+                pass
+            
+            cursor.execute.assert_called_with('SET LOCAL hnsw.ef_search TO DEFAULT')
+            
+    def test_search_with_embedding_isolates_models_in_shared_transaction(self):
+        """Test each model gets its own savepoint once ef_search opened a transaction"""
+        with patch.object(self.service, '_hnsw_ef_search') as mock_ef_search, \
+             patch.object(self.service, '_search_model', return_value=[]) as mock_search:
+            mock_ef_search.return_value.__enter__.return_value = True
+            
+            self.service._search_with_embedding([0.1], ['story', 'event'], 50, 0.7)
+            
+            self.assertEqual(mock_search.call_count, 2)
+            for search_call in mock_search.call_args_list:
+                self.assertIs(search_call.kwargs['savepoint'], True)
+            
+    def test_hnsw_ef_search_default_for_small_limit(self):
+        """Test the session default is kept for small limits"""
+        with patch('ai_integration.services.search_service.connection') as mock_connection, \
+             patch('ai_integration.services.search_service.transaction') as mock_transaction:
+            mock_connection.vendor = 'postgresql'
+            
+            with self.service._hnsw_ef_search(10):
+                pass
+            
+            mock_transaction.atomic.assert_not_called()
+            mock_connection.cursor.assert_not_called()
+            
     def test_search_model_success(self):
         """Test successful _search_model"""
         mock_embedding = [0.1, 0.2, 0.3]
@@ -195,6 +297,25 @@ class TestSearchService(unittest.TestCase):
         
         self.assertEqual(results, [])
         
+    def test_search_model_exception_rolls_back_savepoint(self):
+        """Test a failed query inside a shared transaction only rolls back its own savepoint"""
+        mock_queryset = Mock()
+        mock_queryset.filter.return_value = mock_queryset
+        mock_queryset.annotate.return_value = mock_queryset
+        mock_queryset.order_by.return_value = [Mock()]
+        mock_model = Mock()
+        mock_model.__name__ = 'Story'
+        mock_model.objects = mock_queryset
+        
+        with patch('ai_integration.services.search_service.transaction') as mock_transaction, \
+             patch.object(self.service, '_format_search_result', side_effect=Exception("Database error")):
+            mock_transaction.atomic.return_value.__exit__.return_value = False
+            results = self.service._search_model(mock_model, [0.1], 50, 0.7, savepoint=True)
+        
+        self.assertEqual(results, [])
+        exit_args = mock_transaction.atomic.return_value.__exit__.call_args[0]
+        self.assertIs(exit_args[0], Exception)
+        
     def test_format_search_result_story(self):
         """Test _format_search_result for Story model"""
         # Mock story object with proper type
@@ -0,0 +1,90 @@
+"""
+Query-count regression tests for SearchService
+"""
+import pytest
+from datetime import date
+from unittest.mock import patch
+from django.test import TestCase
+from django.utils import timezone
+from family.models import Story, Event, Heritage, Health, Person
+from ai_integration.services.search_service import SearchService
+
+
+ROWS_PER_MODEL = 50
+EMBEDDING = [1.0] + [0.0] * 1535
+
+
+@pytest.mark.requires_pgvector
+class TestSearchQueryCounts(TestCase):
+    """Query counts must not grow with the number of rows or results"""
+
+    @classmethod
+    def setUpTestData(cls):
+        person = Person.objects.create(name="Test Person")
+        now = timezone.now()
+
+        stories = Story.objects.bulk_create([
+            Story(title=f"Story {i}", content="content", content_embedding=EMBEDDING)
+            for i in range(ROWS_PER_MODEL)
+        ])
+        events = Event.objects.bulk_create([
+            Event(name=f"Event {i}", event_type='other', start_date=now, content_embedding=EMBEDDING)
+            for i in range(ROWS_PER_MODEL)
+        ])
+        Heritage.objects.bulk_create([
+            Heritage(title=f"Heritage {i}", description="description", heritage_type='other',
+                     origin_person=person, content_embedding=EMBEDDING)
+            for i in range(ROWS_PER_MODEL)
+        ])
+        Health.objects.bulk_create([
+            Health(title=f"Health {i}", description="description", record_type='other',
+                   date=date.today(), person=person, content_embedding=EMBEDDING)
+            for i in range(ROWS_PER_MODEL)
+        ])
+        Story.people.through.objects.bulk_create([
+            Story.people.through(story=story, person=person) for story in stories
+        ])
+        Event.participants.through.objects.bulk_create([
+            Event.participants.through(event=event, person=person) for event in events
+        ])
+        cls.story_id = stories[0].id
+
+    def setUp(self):
+        self.service = SearchService()
+
+    def test_semantic_search_query_count(self):
+        """One query per model plus the people and participants prefetches"""
+        with patch.object(self.service.embedding_service, 'generate_embedding', return_value=EMBEDDING):
+            for limit in (5, 10):
+                with self.assertNumQueries(6):
+                    results = self.service.semantic_search("family", limit=limit)
+                self.assertEqual(len(results), limit)
+    
+    def test_semantic_search_query_count_with_wider_ef_search(self):
+        """Large limits set hnsw.ef_search once for the whole search, not once per model"""
+        limit = ROWS_PER_MODEL
+        self.assertGreater(limit * 4, SearchService.HNSW_EF_SEARCH)
+        
+        with patch.object(self.service.embedding_service, 'generate_embedding', return_value=EMBEDDING):
+            # On top of the 6 search queries: SET LOCAL, and a SAVEPOINT/RELEASE pair
+            # per model so one failed model cannot abort the shared transaction.
+            # TestCase already holds a transaction, which adds the outer SAVEPOINT
+            # and RELEASE, the current_setting read and the restoring SET LOCAL
+            with self.assertNumQueries(19) as captured:
+                results = self.service.semantic_search("family", limit=limit)
+        
+        self.assertEqual(len(results), limit)
+        set_local = [q['sql'] for q in captured.captured_queries if 'SET LOCAL hnsw.ef_search' in q['sql']]
+        self.assertEqual(len(set_local), 2)
+        self.assertIn(str(limit * 4), set_local[0])
+
+    def test_find_related_content_query_count(self):
+        """The reference lookup plus one query per model and the prefetches"""
+        with self.assertNumQueries(7):
+            results = self.service.find_related_content(self.story_id, 'story', limit=5)
+
+        self.assertEqual(len(results), 5)
+        self.assertNotIn(
+            ('story', self.story_id),
+            [(result['content_type'], result['id']) for result in results]
+        )
@@ -35,10 +35,8 @@ import unittest
 from unittest.mock import Mock, patch, MagicMock
 import logging
 
-from ai_integration.signals import (
-    update_story_embedding, update_event_embedding,
-    update_heritage_embedding, update_health_embedding
-)
+from ai_integration.signals import update_content_embedding
+from family.models import Story, Event, Heritage, Health
 
 
 class TestSignals(unittest.TestCase):
@@ -49,12 +47,31 @@ class TestSignals(unittest.TestCase):
         # Disable logging during tests
         logging.disable(logging.CRITICAL)
         
+        # Run on_commit callbacks straight away, as in autocommit mode
+        on_commit_patcher = patch('ai_integration.signals.transaction.on_commit', side_effect=lambda func: func())
+        self.mock_on_commit = on_commit_patcher.start()
+        self.addCleanup(on_commit_patcher.stop)
+        
     def tearDown(self):
         """Clean up after tests"""
         logging.disable(logging.NOTSET)
         
+    def test_update_deferred_until_commit(self):
+        """Test the embedding update is registered to run after the save commits"""
+        self.mock_on_commit.side_effect = None
+        mock_instance = Mock()
+        
+        with patch('ai_integration.signals.embedding_service') as mock_service:
+            update_content_embedding(sender=Story, instance=mock_instance, created=True)
+            
+            mock_service.update_model_embedding.assert_not_called()
+            self.mock_on_commit.call_args[0][0]()
+            mock_service.update_model_embedding.assert_called_once_with(
+                mock_instance, force_update=True
+            )
+            
     def test_update_story_embedding_created_success(self):
-        """Test update_story_embedding when story is created successfully"""
+        """Test update_content_embedding for story when story is created successfully"""
         mock_instance = Mock()
         mock_instance.id = 1
         
@@ -62,7 +79,7 @@ class TestSignals(unittest.TestCase):
             mock_service.update_model_embedding.return_value = True
             
             # Call signal handler
-            update_story_embedding(sender=Mock(), instance=mock_instance, created=True)
+            update_content_embedding(sender=Story, instance=mock_instance, created=True)
             
             # Verify update_model_embedding was called with force_update=True
             mock_service.update_model_embedding.assert_called_once_with(
@@ -70,7 +87,7 @@ class TestSignals(unittest.TestCase):
             )
             
     def test_update_story_embedding_updated_success(self):
-        """Test update_story_embedding when story is updated successfully"""
+        """Test update_content_embedding for story when story is updated successfully"""
         mock_instance = Mock()
         mock_instance.id = 2
         
@@ -78,7 +95,7 @@ class TestSignals(unittest.TestCase):
             mock_service.update_model_embedding.return_value = True
             
             # Call signal handler
-            update_story_embedding(sender=Mock(), instance=mock_instance, created=False)
+            update_content_embedding(sender=Story, instance=mock_instance, created=False)
             
             # Verify update_model_embedding was called with force_update=False
             mock_service.update_model_embedding.assert_called_once_with(
@@ -86,7 +103,7 @@ class TestSignals(unittest.TestCase):
             )
             
     def test_update_story_embedding_exception(self):
-        """Test update_story_embedding when exception occurs"""
+        """Test update_content_embedding for story when exception occurs"""
         mock_instance = Mock()
         mock_instance.id = 3
         
@@ -95,7 +112,7 @@ class TestSignals(unittest.TestCase):
             
             with patch('ai_integration.signals.logger') as mock_logger:
                 # Call signal handler - should not raise exception
-                update_story_embedding(sender=Mock(), instance=mock_instance, created=True)
+                update_content_embedding(sender=Story, instance=mock_instance, created=True)
                 
                 # Verify error was logged
                 mock_logger.error.assert_called_once()
@@ -103,7 +120,7 @@ class TestSignals(unittest.TestCase):
                 self.assertIn("Failed to update Story embedding", error_msg)
                 
     def test_update_event_embedding_created_success(self):
-        """Test update_event_embedding when event is created successfully"""
+        """Test update_content_embedding for event when event is created successfully"""
         mock_instance = Mock()
         mock_instance.id = 10
         
@@ -111,7 +128,7 @@ class TestSignals(unittest.TestCase):
             mock_service.update_model_embedding.return_value = True
             
             # Call signal handler
-            update_event_embedding(sender=Mock(), instance=mock_instance, created=True)
+            update_content_embedding(sender=Event, instance=mock_instance, created=True)
             
             # Verify update_model_embedding was called with force_update=True
             mock_service.update_model_embedding.assert_called_once_with(
@@ -119,7 +136,7 @@ class TestSignals(unittest.TestCase):
             )
             
     def test_update_event_embedding_updated_success(self):
-        """Test update_event_embedding when event is updated successfully"""
+        """Test update_content_embedding for event when event is updated successfully"""
         mock_instance = Mock()
         mock_instance.id = 11
         
@@ -127,7 +144,7 @@ class TestSignals(unittest.TestCase):
             mock_service.update_model_embedding.return_value = True
             
             # Call signal handler
-            update_event_embedding(sender=Mock(), instance=mock_instance, created=False)
+            update_content_embedding(sender=Event, instance=mock_instance, created=False)
             
             # Verify update_model_embedding was called with force_update=False
             mock_service.update_model_embedding.assert_called_once_with(
@@ -135,7 +152,7 @@ class TestSignals(unittest.TestCase):
             )
             
     def test_update_event_embedding_exception(self):
-        """Test update_event_embedding when exception occurs"""
+        """Test update_content_embedding for event when exception occurs"""
         mock_instance = Mock()
         mock_instance.id = 12
         
@@ -144,7 +161,7 @@ class TestSignals(unittest.TestCase):
             
             with patch('ai_integration.signals.logger') as mock_logger:
                 # Call signal handler - should not raise exception
-                update_event_embedding(sender=Mock(), instance=mock_instance, created=True)
+                update_content_embedding(sender=Event, instance=mock_instance, created=True)
                 
                 # Verify error was logged
                 mock_logger.error.assert_called_once()
@@ -152,7 +169,7 @@ class TestSignals(unittest.TestCase):
                 self.assertIn("Failed to update Event embedding", error_msg)
                 
     def test_update_heritage_embedding_created_success(self):
-        """Test update_heritage_embedding when heritage is created successfully"""
+        """Test update_content_embedding for heritage when heritage is created successfully"""
         mock_instance = Mock()
         mock_instance.id = 20
         
@@ -160,7 +177,7 @@ class TestSignals(unittest.TestCase):
             mock_service.update_model_embedding.return_value = True
             
             # Call signal handler
-            update_heritage_embedding(sender=Mock(), instance=mock_instance, created=True)
+            update_content_embedding(sender=Heritage, instance=mock_instance, created=True)
             
             # Verify update_model_embedding was called with force_update=True
             mock_service.update_model_embedding.assert_called_once_with(
@@ -168,7 +185,7 @@ class TestSignals(unittest.TestCase):
             )
             
     def test_update_heritage_embedding_updated_success(self):
-        """Test update_heritage_embedding when heritage is updated successfully"""
+        """Test update_content_embedding for heritage when heritage is updated successfully"""
         mock_instance = Mock()
         mock_instance.id = 21
         
@@ -176,7 +193,7 @@ class TestSignals(unittest.TestCase):
             mock_service.update_model_embedding.return_value = True
             
             # Call signal handler
-            update_heritage_embedding(sender=Mock(), instance=mock_instance, created=False)
+            update_content_embedding(sender=Heritage, instance=mock_instance, created=False)
             
             # Verify update_model_embedding was called with force_update=False
             mock_service.update_model_embedding.assert_called_once_with(
@@ -184,7 +201,7 @@ class TestSignals(unittest.TestCase):
             )
             
     def test_update_heritage_embedding_exception(self):
-        """Test update_heritage_embedding when exception occurs"""
+        """Test update_content_embedding for heritage when exception occurs"""
         mock_instance = Mock()
         mock_instance.id = 22
         
@@ -193,7 +210,7 @@ class TestSignals(unittest.TestCase):
             
             with patch('ai_integration.signals.logger') as mock_logger:
                 # Call signal handler - should not raise exception
-                update_heritage_embedding(sender=Mock(), instance=mock_instance, created=True)
+                update_content_embedding(sender=Heritage, instance=mock_instance, created=True)
                 
                 # Verify error was logged
                 mock_logger.error.assert_called_once()
@@ -201,7 +218,7 @@ class TestSignals(unittest.TestCase):
                 self.assertIn("Failed to update Heritage embedding", error_msg)
                 
     def test_update_health_embedding_created_success(self):
-        """Test update_health_embedding when health record is created successfully"""
+        """Test update_content_embedding for health when health record is created successfully"""
         mock_instance = Mock()
         mock_instance.id = 30
         
@@ -209,7 +226,7 @@ class TestSignals(unittest.TestCase):
             mock_service.update_model_embedding.return_value = True
             
             # Call signal handler
-            update_health_embedding(sender=Mock(), instance=mock_instance, created=True)
+            update_content_embedding(sender=Health, instance=mock_instance, created=True)
             
             # Verify update_model_embedding was called with force_update=True
             mock_service.update_model_embedding.assert_called_once_with(
@@ -217,7 +234,7 @@ class TestSignals(unittest.TestCase):
             )
             
     def test_update_health_embedding_updated_success(self):
-        """Test update_health_embedding when health record is updated successfully"""
+        """Test update_content_embedding for health when health record is updated successfully"""
         mock_instance = Mock()
         mock_instance.id = 31
         
@@ -225,7 +242,7 @@ class TestSignals(unittest.TestCase):
             mock_service.update_model_embedding.return_value = True
             
             # Call signal handler
-            update_health_embedding(sender=Mock(), instance=mock_instance, created=False)
+            update_content_embedding(sender=Health, instance=mock_instance, created=False)
             
             # Verify update_model_embedding was called with force_update=False
             mock_service.update_model_embedding.assert_called_once_with(
@@ -233,7 +250,7 @@ class TestSignals(unittest.TestCase):
             )
             
     def test_update_health_embedding_exception(self):
-        """Test update_health_embedding when exception occurs"""
+        """Test update_content_embedding for health when exception occurs"""
         mock_instance = Mock()
         mock_instance.id = 32
         
@@ -242,7 +259,7 @@ class TestSignals(unittest.TestCase):
             
             with patch('ai_integration.signals.logger') as mock_logger:
                 # Call signal handler - should not raise exception
-                update_health_embedding(sender=Mock(), instance=mock_instance, created=True)
+                update_content_embedding(sender=Health, instance=mock_instance, created=True)
                 
                 # Verify error was logged
                 mock_logger.error.assert_called_once()
@@ -258,8 +275,8 @@ class TestSignals(unittest.TestCase):
             mock_service.update_model_embedding.return_value = True
             
             # Call with extra kwargs that Django might pass
-            update_story_embedding(
-                sender=Mock(), 
+            update_content_embedding(
+                sender=Story, 
                 instance=mock_instance, 
                 created=True,
                 update_fields=['title', 'content'],
@@ -282,19 +299,19 @@ class TestSignals(unittest.TestCase):
             
             with patch('ai_integration.signals.logger') as mock_logger:
                 # Call each signal handler
-                update_story_embedding(sender=Mock(), instance=mock_instance, created=True)
+                update_content_embedding(sender=Story, instance=mock_instance, created=True)
                 mock_logger.info.assert_called_with("Updated embedding for Story:50")
                 
                 mock_logger.reset_mock()
-                update_event_embedding(sender=Mock(), instance=mock_instance, created=True)
+                update_content_embedding(sender=Event, instance=mock_instance, created=True)
                 mock_logger.info.assert_called_with("Updated embedding for Event:50")
                 
                 mock_logger.reset_mock()
-                update_heritage_embedding(sender=Mock(), instance=mock_instance, created=True)
+                update_content_embedding(sender=Heritage, instance=mock_instance, created=True)
                 mock_logger.info.assert_called_with("Updated embedding for Heritage:50")
                 
                 mock_logger.reset_mock()
-                update_health_embedding(sender=Mock(), instance=mock_instance, created=True)
+                update_content_embedding(sender=Health, instance=mock_instance, created=True)
                 mock_logger.info.assert_called_with("Updated embedding for Health:50")
 
 
@@ -0,0 +1,47 @@
+"""
+Tests for the update_embeddings management command
+"""
+from io import StringIO
+from unittest.mock import patch
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import SimpleTestCase
+from family.models import Story, Event, Heritage, Health
+
+
+STATS = {'updated': 2, 'skipped': 1, 'failed': 0}
+
+
+@patch('ai_integration.services.embedding_service.embedding_service.bulk_update_embeddings',
+       return_value=STATS)
+class TestUpdateEmbeddingsCommand(SimpleTestCase):
+    """Test update_embeddings argument handling and output"""
+    
+    def test_single_model(self, mock_bulk_update):
+        """Test --model limits the run to one content type"""
+        out = StringIO()
+        call_command('update_embeddings', '--model', 'story', stdout=out)
+        
+        mock_bulk_update.assert_called_once_with(Story, None, stale=False)
+        self.assertIn('Story: 2 updated, 1 skipped, 0 failed', out.getvalue())
+    
+    def test_all_models_by_default(self, mock_bulk_update):
+        """Test every embedded model is processed without --model"""
+        call_command('update_embeddings', '--batch-size', '10', '--stale', stdout=StringIO())
+        
+        self.assertEqual(
+            [call.args[0] for call in mock_bulk_update.call_args_list],
+            [Story, Event, Heritage, Health]
+        )
+        for call in mock_bulk_update.call_args_list:
+            self.assertEqual(call.args[1], 10)
+            self.assertTrue(call.kwargs['stale'])
+    
+    def test_rejects_non_positive_batch_size(self, mock_bulk_update):
+        """Test --batch-size below 1 is a command error, not a crash"""
+        for batch_size in ('0', '-5'):
+            with self.subTest(batch_size=batch_size):
+                with self.assertRaisesMessage(CommandError, '--batch-size must be at least 1'):
+                    call_command('update_embeddings', '--batch-size', batch_size)
+        
+        mock_bulk_update.assert_not_called()
@@ -2,12 +2,27 @@ from django.shortcuts import render
 from django.http import JsonResponse
 from django.views.decorators.http import require_http_methods
 from django.views.decorators.csrf import csrf_exempt
+from django.utils.functional import SimpleLazyObject
 import json
 import logging
-from .services.rag_service import rag_service
-from .services.search_service import search_service
 from .models import ChatSession, QueryLog
 
+
+def _get_rag_service():
+    from .services.rag_service import rag_service
+    return rag_service
+
+
+def _get_search_service():
+    from .services.search_service import search_service
+    return search_service
+
+
+# Resolved on first request so loading the URLconf (system checks run by
+# migrate, collectstatic and the test runner) does not import the AI SDKs
+rag_service = SimpleLazyObject(_get_rag_service)
+search_service = SimpleLazyObject(_get_search_service)
+
 logger = logging.getLogger(__name__)
 
 
@@ -35,7 +50,7 @@ def chat_endpoint(request):
                     query_text=query,
                     response_text=rag_response['response'],
                     query_type=rag_response['metadata']['query_type'],
-                    confidence=rag_response['metadata']['confidence'],
+                    confidence_score=rag_response['metadata']['confidence'],
                     processing_time=rag_response['metadata']['processing_time']
                 )
             except ChatSession.DoesNotExist:
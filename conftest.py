@@ -0,0 +1,23 @@
+"""
+Shared pytest configuration for the Django test suites
+"""
+import sys
+
+import pytest
+from django.test import override_settings
+
+
+@pytest.fixture(scope='session', autouse=True)
+def fast_password_hasher():
+    """Hash test users' passwords with MD5; PBKDF2 makes every create_user cost hundreds of ms"""
+    with override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher']):
+        yield
+
+
+@pytest.fixture(autouse=True)
+def clear_embedding_memory_cache():
+    """Start every test with an empty in-process embedding cache on the shared service"""
+    yield
+    module = sys.modules.get('ai_integration.services.embedding_service')
+    if module is not None:
+        module.embedding_service.clear_memory_cache()
@@ -0,0 +1,119 @@
+# Generated by Django 5.2.18 on 2026-10-16 18:30
+
+import family.models
+import pgvector.django.halfvec
+from django.db import migrations, models
+
+
+# Columns matched by SearchService.keyword_search with icontains
+KEYWORD_COLUMNS = {
+    'family_story': ['title', 'content'],
+    'family_event': ['name', 'description'],
+    'family_heritage': ['title', 'description'],
+    'family_health': ['title', 'description'],
+}
+
+
+def create_trigram_indexes(apps, schema_editor):
+    """
+    Index the expression Django emits for icontains, UPPER(col::text) LIKE ...,
+    so keyword search can use a trigram index instead of a sequential scan.
+    
+    pg_trgm extracts no trigrams from a pattern shorter than three characters,
+    so only queries of three or more characters (English words, longer Chinese
+    phrases) can use these indexes; one- and two-character queries such as
+    most Chinese keywords still scan the table. Both columns of each model are
+    indexed because keyword_search ORs them, and a BitmapOr needs an index on
+    every branch.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for table, columns in KEYWORD_COLUMNS.items():
+        for column in columns:
+            schema_editor.execute(
+                f'CREATE INDEX IF NOT EXISTS {table}_{column}_trgm ON {table} '
+                f'USING gin (UPPER({column}::text) gin_trgm_ops)'
+            )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for table, columns in KEYWORD_COLUMNS.items():
+        for column in columns:
+            schema_editor.execute(f'DROP INDEX IF EXISTS {table}_{column}_trgm')
+
+
+def hnsw_index(name):
+    return family.models.PostgresHnswIndex(
+        ef_construction=64,
+        fields=['content_embedding'],
+        m=16,
+        name=name,
+        opclasses=['halfvec_ip_ops'],
+    )
+
+
+class Migration(migrations.Migration):
+
+    replaces = [
+        ('family', '0003_content_embedding_hnsw_indexes'),
+        ('family', '0004_content_hash'),
+        ('family', '0005_inner_product_hnsw_indexes'),
+        ('family', '0006_content_embedding_halfvec'),
+        ('family', '0007_keyword_search_trigram_indexes'),
+        ('family', '0008_declare_hnsw_indexes'),
+    ]
+
+    dependencies = [
+        ('family', '0002_event_content_embedding_event_embedding_updated_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='content_hash',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='health',
+            name='content_hash',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='heritage',
+            name='content_hash',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='story',
+            name='content_hash',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AlterField(
+            model_name='event',
+            name='content_embedding',
+            field=pgvector.django.halfvec.HalfVectorField(blank=True, dimensions=1536, null=True),
+        ),
+        migrations.AlterField(
+            model_name='health',
+            name='content_embedding',
+            field=pgvector.django.halfvec.HalfVectorField(blank=True, dimensions=1536, null=True),
+        ),
+        migrations.AlterField(
+            model_name='heritage',
+            name='content_embedding',
+            field=pgvector.django.halfvec.HalfVectorField(blank=True, dimensions=1536, null=True),
+        ),
+        migrations.AlterField(
+            model_name='story',
+            name='content_embedding',
+            field=pgvector.django.halfvec.HalfVectorField(blank=True, dimensions=1536, null=True),
+        ),
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+        migrations.AddIndex(model_name='event', index=hnsw_index('family_event_embedding_hnsw')),
+        migrations.AddIndex(model_name='health', index=hnsw_index('family_health_embedding_hnsw')),
+        migrations.AddIndex(model_name='heritage', index=hnsw_index('family_heritage_embedding_hnsw')),
+        migrations.AddIndex(model_name='story', index=hnsw_index('family_story_embedding_hnsw')),
+    ]
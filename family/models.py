@@ -1,7 +1,33 @@
 from django.db import models
+from django.db.backends.ddl_references import Statement
 from django.contrib.auth.models import User
 from django.urls import reverse
-from pgvector.django import VectorField
+from pgvector.django import HalfVectorField, HnswIndex
+
+
+class PostgresHnswIndex(HnswIndex):
+    """HnswIndex that is a no-op outside PostgreSQL, so sqlite can build the schema from models"""
+
+    def create_sql(self, model, schema_editor, using='', **kwargs):
+        if schema_editor.connection.vendor != 'postgresql':
+            return Statement('')
+        return super().create_sql(model, schema_editor, using=using, **kwargs)
+
+    def remove_sql(self, model, schema_editor, **kwargs):
+        if schema_editor.connection.vendor != 'postgresql':
+            return Statement('')
+        return super().remove_sql(model, schema_editor, **kwargs)
+
+
+def embedding_hnsw_index(name):
+    """HNSW index for inner-product search on a model's content_embedding"""
+    return PostgresHnswIndex(
+        name=name,
+        fields=['content_embedding'],
+        m=16,
+        ef_construction=64,
+        opclasses=['halfvec_ip_ops'],
+    )
 
 
 class Person(models.Model):
@@ -111,11 +137,13 @@ class Event(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     
     # AI Integration fields
-    content_embedding = VectorField(dimensions=1536, null=True, blank=True)
+    content_embedding = HalfVectorField(dimensions=1536, null=True, blank=True)
     embedding_updated = models.DateTimeField(null=True, blank=True)
+    content_hash = models.CharField(max_length=64, blank=True)  # SHA256 of the text the embedding was generated from
     
     class Meta:
         ordering = ['-start_date']
+        indexes = [embedding_hnsw_index('family_event_embedding_hnsw')]
     
     def __str__(self):
         return f"{self.name} ({self.start_date.year})"
@@ -146,12 +174,14 @@ class Story(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     
     # AI Integration fields
-    content_embedding = VectorField(dimensions=1536, null=True, blank=True)
+    content_embedding = HalfVectorField(dimensions=1536, null=True, blank=True)
     embedding_updated = models.DateTimeField(null=True, blank=True)
+    content_hash = models.CharField(max_length=64, blank=True)  # SHA256 of the text the embedding was generated from
     
     class Meta:
         ordering = ['-created_at']
         verbose_name_plural = "Stories"
+        indexes = [embedding_hnsw_index('family_story_embedding_hnsw')]
     
     def __str__(self):
         return self.title
@@ -245,11 +275,13 @@ class Health(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     
     # AI Integration fields
-    content_embedding = VectorField(dimensions=1536, null=True, blank=True)
+    content_embedding = HalfVectorField(dimensions=1536, null=True, blank=True)
     embedding_updated = models.DateTimeField(null=True, blank=True)
+    content_hash = models.CharField(max_length=64, blank=True)  # SHA256 of the text the embedding was generated from
     
     class Meta:
         ordering = ['-date']
+        indexes = [embedding_hnsw_index('family_health_embedding_hnsw')]
     
     def __str__(self):
         return f"{self.person.name} - {self.title}"
@@ -287,8 +319,12 @@ class Heritage(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     
     # AI Integration fields
-    content_embedding = VectorField(dimensions=1536, null=True, blank=True)
+    content_embedding = HalfVectorField(dimensions=1536, null=True, blank=True)
     embedding_updated = models.DateTimeField(null=True, blank=True)
+    content_hash = models.CharField(max_length=64, blank=True)  # SHA256 of the text the embedding was generated from
+    
+    class Meta:
+        indexes = [embedding_hnsw_index('family_heritage_embedding_hnsw')]
     
     def __str__(self):
         return self.title
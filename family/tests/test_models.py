@@ -1,9 +1,12 @@
 import pytest
+from django.apps import apps
 from django.test import TestCase
 from django.core.exceptions import ValidationError
 from django.db import IntegrityError
+from django.db.utils import ConnectionHandler
 from decimal import Decimal
 from datetime import date, datetime
+from types import SimpleNamespace
 
 from family.models import (
     Person, Location, Institution, Event, Story, Multimedia,
@@ -300,4 +303,30 @@ class TestTimelineModel:
         
         assert timeline.people.count() == 1
         assert timeline.events.count() == 1
-        assert timeline.stories.count() == 1
\ No newline at end of file
+        assert timeline.stories.count() == 1
+
+
+class TestEmbeddingHnswIndexes:
+    """Meta.indexes declares the HNSW indexes, which sqlite has to skip when a schema is built from the models"""
+    
+    def test_sqlite_schema_builds_from_models(self, django_db_blocker):
+        connection = ConnectionHandler(
+            {'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'}}
+        )['default']
+        with django_db_blocker.unblock():
+            try:
+                with connection.schema_editor(atomic=False) as editor:
+                    for model in apps.get_models():
+                        editor.create_model(model)
+                with connection.cursor() as cursor:
+                    for model in (Event, Story, Health, Heritage):
+                        constraints = connection.introspection.get_constraints(cursor, model._meta.db_table)
+                        assert not any(name.endswith('_embedding_hnsw') for name in constraints)
+            finally:
+                connection.close()
+    
+    def test_hnsw_index_emits_no_sql_outside_postgresql(self):
+        index = Event._meta.indexes[0]
+        editor = SimpleNamespace(connection=SimpleNamespace(vendor='sqlite'))
+        assert str(index.create_sql(Event, editor)) == ''
+        assert str(index.remove_sql(Event, editor)) == ''